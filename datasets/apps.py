@@ -3,3 +3,9 @@ from django.apps import AppConfig
 
 class DatasetsConfig(AppConfig):
     name = 'datasets'
+
+    def ready(self):
+        from mlswarm_api.metrics import registry, observe_cache
+        from .models import chunk_cache
+
+        registry.collector(lambda: observe_cache(chunk_cache, 'chunks'))
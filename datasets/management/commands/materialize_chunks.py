@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from datasets.models import Chunk
+
+
+class Command(BaseCommand):
+    help = 'Converts chunks into binary columnar files, memory-mapped by the tasks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('chunks', nargs='*', type=int,
+                            help='The ids of the chunks. All chunks are converted if omitted.')
+        parser.add_argument('--dataset', type=int, default=None,
+                            help='Only convert the chunks of this dataset.')
+        parser.add_argument('--force', action='store_true',
+                            help='Convert chunks that were already materialized.')
+
+    def handle(self, *args, **options):
+        chunks = Chunk.objects.all()
+        if options['chunks']:
+            chunks = chunks.filter(pk__in=options['chunks'])
+        if options['dataset'] is not None:
+            chunks = chunks.filter(dataset_id=options['dataset'])
+
+        for chunk in chunks.iterator():
+            if chunk.is_materialized and not options['force']:
+                continue
+
+            try:
+                chunk.materialize()
+            except ValueError as e:
+                self.stderr.write(str(e))
+            else:
+                self.stdout.write('materialized %s' % chunk)
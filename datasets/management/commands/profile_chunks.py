@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from datasets.models import Chunk
+
+
+class Command(BaseCommand):
+    help = 'Computes the row count, schema, statistics and digest of chunks.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('chunks', nargs='*', type=int,
+                            help='The ids of the chunks. All chunks are profiled if omitted.')
+        parser.add_argument('--dataset', type=int, default=None,
+                            help='Only profile the chunks of this dataset.')
+        parser.add_argument('--force', action='store_true',
+                            help='Profile chunks that were already profiled.')
+
+    def handle(self, *args, **options):
+        chunks = Chunk.objects.all()
+        if options['chunks']:
+            chunks = chunks.filter(pk__in=options['chunks'])
+        if options['dataset'] is not None:
+            chunks = chunks.filter(dataset_id=options['dataset'])
+        if not options['force']:
+            chunks = chunks.filter(rows__isnull=True)
+
+        for chunk in chunks.iterator():
+            try:
+                chunk.profile()
+            except Exception as e:
+                self.stderr.write('%s: %s' % (chunk, e))
+            else:
+                self.stdout.write('profiled %s: %i rows' % (chunk, chunk.rows))
@@ -1,7 +1,22 @@
-from django.db.models import CharField, ForeignKey, PROTECT
+import hashlib
+import json
+import os
+from logging import warning
 
+from django.conf import settings
+from django.core.files.storage import FileSystemStorage
+from django.db.models import CharField, ForeignKey, PositiveIntegerField, TextField, PROTECT
+from django.utils import timezone
+from django.utils.functional import cached_property
+
+from mlswarm_api.caches import LRUCache
 from mlswarm_api.models import IDatable, IServiceTower
-from . import services
+from . import services, stats
+
+chunks_fs = FileSystemStorage('chunks/')
+
+# Parsed chunks, shared by all tasks running in this process.
+chunk_cache = LRUCache(settings.CHUNK_CACHE.get('max_size', 0))
 
 
 class Dataset(IDatable):
@@ -25,8 +40,149 @@ class Chunk(IServiceTower, IDatable):
         null=False,
         choices=services.parsers.to_choices(),
         help_text='The service used to parse the content within the properties.')
+    materialized = CharField(
+        max_length=128,
+        blank=True,
+        help_text='The binary columnar file holding the parsed content of this chunk.')
+    rows = PositiveIntegerField(
+        null=True, blank=True,
+        help_text='The number of rows in this chunk.')
+    raw_schema = TextField(
+        blank=True,
+        help_text='The type of each column of this chunk.')
+    raw_stats = TextField(
+        blank=True,
+        help_text='The min, max and mean of each numeric column and the label histogram.')
+    content_digest = CharField(
+        max_length=64, blank=True, db_index=True,
+        help_text='The digest of the parsed content of this chunk.')
 
     services = services.parsers
 
+    @property
+    def fingerprint(self):
+        h = hashlib.sha1()
+        for v in (self.service, self.raw_properties, self.updated_at.isoformat()):
+            h.update(str(v).encode())
+        return h.hexdigest()
+
+    @property
+    def digest(self):
+        h = hashlib.sha1()
+        for v in (self.service, self.raw_properties):
+            h.update(str(v).encode())
+        return h.hexdigest()
+
+    @property
+    def schema(self):
+        return json.loads(self.raw_schema) if self.raw_schema else None
+
+    @property
+    def stats(self):
+        return json.loads(self.raw_stats) if self.raw_stats else None
+
+    @property
+    def materialized_name(self):
+        return '%i-%s.npy' % (self.pk, self.digest[:16])
+
+    @property
+    def is_materialized(self):
+        # Files left by previous properties are stale.
+        return (bool(self.materialized)
+                and self.materialized == self.materialized_name
+                and chunks_fs.exists(self.materialized))
+
+    def materialize(self):
+        import numpy as np
+
+        # Materialized chunks are loaded as arrays, whatever their parser returns.
+        data = np.asarray(super().build())
+        if data.dtype == object:
+            raise ValueError('%s cannot be materialized, as its content is '
+                             'not numeric.' % self)
+
+        name = self.materialized_name
+        path = chunks_fs.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        # Columns are laid out contiguously, so they can be read individually.
+        with open(path + '.tmp', 'wb') as f:
+            np.save(f, np.asfortranarray(data))
+        os.replace(path + '.tmp', path)
+
+        if self.materialized != name:
+            self.dematerialize()
+        self.materialized = name
+        self.profile(data)
+
+    def profile(self, data=None):
+        """Compute the statistics of the content, stored along with the chunk."""
+        options = settings.CHUNK_STATS
+        if data is None:
+            data = super().build()
+
+        description = stats.describe(data, options.get('label_column', -1),
+                                     options.get('max_labels', 100))
+        self.rows = description['rows']
+        self.raw_schema = json.dumps(description['schema'])
+        self.raw_stats = json.dumps(description['stats'])
+        self.content_digest = description['digest']
+        self.updated_at = timezone.now()
+
+        Chunk.objects.filter(pk=self.pk).update(
+            materialized=self.materialized, rows=self.rows, raw_schema=self.raw_schema,
+            raw_stats=self.raw_stats, content_digest=self.content_digest,
+            updated_at=self.updated_at)
+
+    def try_profile(self, data=None):
+        try:
+            self.profile(data)
+        except Exception as e:
+            warning('%s could not be profiled: %s', self, e)
+            self.forget_profile()
+            return False
+        return True
+
+    def forget_profile(self):
+        # Statistics of previous properties no longer hold.
+        self.rows, self.raw_schema, self.raw_stats, self.content_digest = None, '', '', ''
+        Chunk.objects.filter(pk=self.pk).update(rows=None, raw_schema='', raw_stats='',
+                                                content_digest='')
+
+    def dematerialize(self):
+        if self.materialized and chunks_fs.exists(self.materialized):
+            chunks_fs.delete(self.materialized)
+        self.materialized = ''
+
+    def discard_upload(self):
+        # Files written by the bulk upload belong to their chunk.
+        path = self.properties.get('path') if isinstance(self.properties, dict) else None
+        uploads = chunks_fs.path('uploads') + os.sep
+        if path and path.startswith(uploads) and os.path.exists(path):
+            os.remove(path)
+
+    @cached_property
+    def loaded(self):
+        key = self.pk, self.fingerprint
+        data = chunk_cache.get_or_load(key, self.build)
+
+        # Chunks not profiled on ingestion are profiled by the first task parsing them.
+        if self.rows is None and self.try_profile(data):
+            # Profiling changes the fingerprint the data is cached under.
+            chunk_cache.pop(key)
+            chunk_cache.put((self.pk, self.fingerprint), data)
+        return data
+
+    def build(self):
+        if self.is_materialized:
+            import numpy as np
+            return np.load(chunks_fs.path(self.materialized), mmap_mode='r')
+
+        data = super().build()
+        if hasattr(data, 'flags'):
+            # Cached arrays are shared between tasks.
+            data.flags.writeable = False
+        return data
+
     def __str__(self):
         return 'ds-%s #%i' % (self.dataset, self.pk)
@@ -1,3 +1,5 @@
+import json
+
 from rest_framework import serializers
 
 from mlswarm_api.serializers import PropertiesSerializerMixin
@@ -5,28 +7,75 @@ from . import models, services
 
 
 class ChunkInfoSerializer(serializers.ModelSerializer):
+    schema = serializers.JSONField(read_only=True)
+    stats = serializers.JSONField(read_only=True)
+
     class Meta:
         model = models.Chunk
-        fields = ['id', 'service', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'service', 'created_at', 'updated_at']
+        fields = ['id', 'service', 'rows', 'schema', 'stats', 'content_digest',
+                  'created_at', 'updated_at']
+        read_only_fields = fields
 
 
 class DatasetSerializer(serializers.HyperlinkedModelSerializer):
     chunks = ChunkInfoSerializer(many=True, read_only=True)
+    rows = serializers.SerializerMethodField(
+        help_text='The number of rows in all chunks, if known for every one of them.')
 
     class Meta:
         model = models.Dataset
-        fields = ['id', 'url', 'name', 'chunks', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'url', 'chunks', 'created_at', 'updated_at']
+        fields = ['id', 'url', 'name', 'rows', 'chunks', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'url', 'rows', 'chunks', 'created_at', 'updated_at']
+
+    def get_rows(self, dataset):
+        rows = [c.rows for c in dataset.chunks.all()]
+        return None if None in rows else sum(rows)
 
 
 class ChunkSerializer(PropertiesSerializerMixin,
                       serializers.ModelSerializer):
     dataset = serializers.PrimaryKeyRelatedField(read_only=True)
     properties = serializers.JSONField(help_text='The properties of this Chunk\'s service.')
+    materialize = serializers.BooleanField(
+        default=False, write_only=True,
+        help_text='Whether the content should be converted into a binary columnar '
+                  'file, memory-mapped by the tasks instead of parsed again. Tasks then '
+                  'receive it as a numeric array, whatever the parser returns.')
+    schema = serializers.JSONField(read_only=True)
+    stats = serializers.JSONField(read_only=True)
     services = services.parsers
 
     class Meta:
         model = models.Chunk
-        fields = ['id', 'dataset', 'service', 'properties', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'dataset', 'created_at', 'updated_at']
+        fields = ['id', 'dataset', 'service', 'properties', 'materialize', 'is_materialized',
+                  'rows', 'schema', 'stats', 'content_digest', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'dataset', 'is_materialized', 'rows', 'content_digest',
+                            'created_at', 'updated_at']
+
+
+class ChunkUploadSerializer(serializers.Serializer):
+    service = serializers.ChoiceField(
+        choices=['csv', 'json'],
+        help_text='The parser of the uploaded content. JSON uploads are read as JSON lines.')
+    rows = serializers.IntegerField(
+        required=False, min_value=1,
+        help_text='The maximum number of rows in each chunk.')
+    header = serializers.BooleanField(
+        default=True,
+        help_text='Whether the first line of a CSV upload is a header, repeated on each chunk.')
+    properties = serializers.JSONField(
+        required=False, default=dict,
+        help_text='The properties of the parser shared by all chunks, besides their path.')
+    materialize = serializers.BooleanField(
+        default=False,
+        help_text='Whether the chunks should be materialized once created.')
+
+    def validate_properties(self, value):
+        if isinstance(value, str):
+            try:
+                value = json.loads(value)
+            except json.JSONDecodeError as e:
+                raise serializers.ValidationError('Value must be valid JSON: %s' % str(e))
+        if not isinstance(value, dict):
+            raise serializers.ValidationError('A JSON object is expected.')
+        return value
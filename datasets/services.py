@@ -1,7 +1,6 @@
-from mlswarm.infrastructure.services import ServiceBuilder
-from mlswarm.infrastructure.services.parsers.serializers import CSVParserSerializer, JSONParserSerializer
+from mlswarm_api.services import LazyServiceBuilder
 
-parsers = ServiceBuilder({
-    'csv': CSVParserSerializer,
-    'json': JSONParserSerializer
+parsers = LazyServiceBuilder({
+    'csv': 'mlswarm.infrastructure.services.parsers.serializers.CSVParserSerializer',
+    'json': 'mlswarm.infrastructure.services.parsers.serializers.JSONParserSerializer',
 })
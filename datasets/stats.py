@@ -0,0 +1,70 @@
+import hashlib
+
+NUMERIC_KINDS = 'biuf'
+
+
+def column_types(data):
+    """The type of each column of a parsed chunk."""
+    if data.dtype != object:
+        return [str(data.dtype)] * (data.shape[1] if data.ndim > 1 else 1)
+
+    first = data[0] if data.ndim > 1 else data[:1]
+    return [type(v).__name__ for v in first]
+
+
+def is_numeric(type_name: str):
+    import numpy as np
+
+    try:
+        return np.dtype(type_name).kind in NUMERIC_KINDS
+    except TypeError:
+        return False
+
+
+def compatible(a: list, b: list):
+    """Whether chunks of schemas `a` and `b` can be used together."""
+    return len(a) == len(b) and all(x == y or is_numeric(x) and is_numeric(y)
+                                    for x, y in zip(a, b))
+
+
+def digest(data, block_rows=65536):
+    h = hashlib.sha256()
+    h.update(('%s%s' % (data.dtype, data.shape)).encode())
+
+    # Rows are hashed in blocks, which bounds the copies of Fortran arrays.
+    for i in range(0, len(data), block_rows):
+        block = data[i:i + block_rows]
+        h.update(block.tobytes() if data.dtype != object else repr(block.tolist()).encode())
+    return h.hexdigest()
+
+
+def describe(data, label_column=-1, max_labels=100):
+    """Row count, schema, column statistics, label histogram and digest of a chunk."""
+    import numpy as np
+
+    data = np.asarray(data)
+    columns = data.reshape(len(data), -1) if data.ndim != 2 else data
+    schema = column_types(data)
+
+    stats = []
+    for j, type_name in enumerate(schema):
+        column = columns[:, j]
+        if not len(column) or not is_numeric(type_name):
+            stats.append(None)
+            continue
+        if column.dtype == object:
+            column = column.astype(float)
+        stats.append({'min': column.min().item(),
+                      'max': column.max().item(),
+                      'mean': column.mean().item()})
+
+    labels = None
+    if len(columns) and columns.shape[1] > 1:
+        values, counts = np.unique(columns[:, label_column].astype(str), return_counts=True)
+        if len(values) <= max_labels:
+            labels = dict(zip(values.tolist(), counts.tolist()))
+
+    return {'rows': len(data),
+            'schema': schema,
+            'stats': {'columns': stats, 'labels': labels},
+            'digest': digest(data)}
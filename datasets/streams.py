@@ -0,0 +1,113 @@
+import copy
+import functools
+import json
+
+from . import stats
+
+
+class ChunkStream:
+    """Iterates over the data of a set of chunks, one chunk at a time.
+
+    Only the chunk being consumed is kept in memory, so estimators that
+    accept streams (`accepts_streams = True`) can train over datasets
+    larger than the worker's memory. `merged` builds a single dataset for
+    the estimators that do not.
+
+    Parts are shared with the other tasks through the chunk cache, so
+    streamed arrays are read-only. Merged datasets are always copies, which
+    estimators may modify in place.
+    """
+
+    def __init__(self, chunks):
+        self.chunks = chunks
+
+    def __len__(self):
+        return self.chunks.count()
+
+    def __iter__(self):
+        for chunk in self.chunks.iterator():
+            yield chunk.loaded
+
+    def batches(self, size: int = None):
+        for part in self:
+            if size is None or not hasattr(part, '__getitem__'):
+                yield part
+                continue
+
+            for i in range(0, len(part), size):
+                yield part[i:i + size]
+
+    def layout(self):
+        """The number of rows and dtype of the merged chunks, if known from their stats."""
+        import numpy as np
+
+        known = list(self.chunks.values_list('rows', 'raw_schema'))
+        if not known or any(rows is None or not schema for rows, schema in known):
+            return None
+
+        types = {t for _, schema in known for t in json.loads(schema)}
+        if not all(stats.is_numeric(t) for t in types):
+            return None
+        return sum(rows for rows, _ in known), np.result_type(*types)
+
+    def filled(self, rows: int, dtype):
+        """Read the chunks straight into an array of `rows` rows, if they fill it exactly.
+
+        `None` is returned when the stored stats do not match the content,
+        e.g. if the chunks changed since they were profiled.
+        """
+        import numpy as np
+
+        merged, offset = None, 0
+        for part in self:
+            if not isinstance(part, np.ndarray):
+                return None
+            if merged is None:
+                merged = np.empty((rows, *part.shape[1:]), dtype=dtype)
+            if part.shape[1:] != merged.shape[1:] or offset + part.shape[0] > rows:
+                return None
+
+            merged[offset:offset + part.shape[0]] = part
+            offset += part.shape[0]
+
+        return merged if offset == rows else None
+
+    def merged(self):
+        import numpy as np
+
+        layout = self.layout()
+        if layout is not None and len(self) > 1:
+            merged = self.filled(*layout)
+            if merged is not None:
+                return merged
+
+        # Parts are held until merged, so uncached chunks are only parsed once.
+        parts = list(self)
+        first = parts[0]
+
+        arrays = [isinstance(part, np.ndarray) for part in parts]
+        if not any(arrays):
+            return first.concatenate(parts) if len(parts) > 1 else copy.deepcopy(first)
+        if not all(arrays):
+            # Materialized chunks are arrays, while their parser may return other types.
+            parts = [np.asarray(part) for part in parts]
+            first = parts[0]
+
+        # Arrays are copied into a single allocation, filled in place.
+        rows = sum(part.shape[0] for part in parts)
+        if rows == first.shape[0]:
+            return np.array(first)
+
+        dtype = functools.reduce(np.promote_types, (part.dtype for part in parts))
+        merged = np.empty((rows, *first.shape[1:]), dtype=dtype)
+        offset = 0
+        del first
+        parts.reverse()
+
+        while parts:
+            # Each part is released as soon as it is copied.
+            part = parts.pop()
+            merged[offset:offset + part.shape[0]] = part
+            offset += part.shape[0]
+
+        return merged
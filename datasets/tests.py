@@ -1,3 +1,267 @@
-from django.test import TestCase
+import io
+import json
+import shutil
+import tempfile
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase, override_settings
+from rest_framework.test import APITestCase
+
+from mlswarm_api.caches import LRUCache
+from mlswarm_api.models import IServiceTower
+from . import stats
+from .models import Chunk, Dataset, chunk_cache, chunks_fs
+from .streams import ChunkStream
+from .uploads import split_lines
+from .views import ChunkViewSet
+
+
+class LRUCacheTest(SimpleTestCase):
+    def test_evicts_least_recently_used(self):
+        evicted = []
+        cache = LRUCache(2, sizeof=lambda value: 1, on_evict=evicted.append)
+        cache.put('a', 1)
+        cache.put('b', 2)
+        cache.get('a')
+        cache.put('c', 3)
+
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+        self.assertEqual(evicted, [2])
+        self.assertEqual(cache.stats['evictions'], 1)
+
+    def test_keeps_entries_within_max_size(self):
+        cache = LRUCache(10, sizeof=len)
+        cache.put('a', 'x' * 4)
+        cache.put('b', 'x' * 4)
+        cache.put('c', 'x' * 4)
+
+        self.assertEqual(len(cache), 2)
+        self.assertEqual(cache.size, 8)
+
+    def test_does_not_keep_entries_larger_than_the_cache(self):
+        cache = LRUCache(10, sizeof=len)
+        cache.put('a', 'x')
+
+        self.assertEqual(cache.put('b', 'x' * 11), 'x' * 11)
+        self.assertNotIn('b', cache)
+        self.assertIn('a', cache)
+        self.assertEqual(cache.size, 1)
+
+    def test_replacing_an_entry_updates_the_size(self):
+        cache = LRUCache(10, sizeof=len)
+        cache.put('a', 'xx')
+        cache.put('a', 'xxxx')
+
+        self.assertEqual(cache.get('a'), 'xxxx')
+        self.assertEqual(cache.size, 4)
+
+    def test_loads_missing_entries_once(self):
+        loads = []
+        cache = LRUCache(10, sizeof=lambda value: 1)
+
+        def load():
+            loads.append(1)
+            return 'value'
+
+        self.assertEqual(cache.get_or_load('a', load), 'value')
+        self.assertEqual(cache.get_or_load('a', load), 'value')
+        self.assertEqual(len(loads), 1)
+        self.assertEqual(cache.stats['hits'], 1)
+        self.assertEqual(cache.stats['misses'], 1)
+
+    def test_pop_and_clear(self):
+        evicted = []
+        cache = LRUCache(10, sizeof=lambda value: 1, on_evict=evicted.append)
+        cache.put('a', 1)
+        cache.put('b', 2)
+
+        self.assertEqual(cache.pop('a'), 1)
+        self.assertIsNone(cache.pop('a'))
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.size, 0)
+        self.assertEqual(evicted, [2])
+
+
+class SplitLinesTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def split(self, content, service, rows, header=True):
+        parts = []
+        for path, count in split_lines(io.BytesIO(content), self.directory,
+                                       service, rows, header):
+            with open(path, 'rb') as f:
+                parts.append((f.read(), count))
+        return parts
+
+    def test_repeats_the_csv_header_on_every_part(self):
+        self.assertEqual(self.split(b'a,b\n1,2\n3,4\n5,6\n', 'csv', 2),
+                         [(b'a,b\n1,2\n3,4\n', 2), (b'a,b\n5,6\n', 1)])
+
+    def test_csv_without_header(self):
+        self.assertEqual(self.split(b'1,2\n3,4\n', 'csv', 1, header=False),
+                         [(b'1,2\n', 1), (b'3,4\n', 1)])
+
+    def test_skips_blank_lines_and_normalizes_line_endings(self):
+        self.assertEqual(self.split(b'a,b\r\n1,2\r\n\r\n3,4', 'csv', 10),
+                         [(b'a,b\r\n1,2\n3,4\n', 2)])
+
+    def test_writes_json_lines_as_arrays(self):
+        parts = self.split(b'{"a": 1}\n{"a": 2}\n{"a": 3}\n', 'json', 2)
+
+        self.assertEqual([count for _, count in parts], [2, 1])
+        self.assertEqual([json.loads(content.decode()) for content, _ in parts],
+                         [[{'a': 1}, {'a': 2}], [{'a': 3}]])
+
+    def test_upload_without_rows(self):
+        self.assertEqual(self.split(b'a,b\n\n', 'csv', 10), [])
+
+
+class DetailRoutesTest(APITestCase):
+    def setUp(self):
+        self.client.force_authenticate(
+            User.objects.create_superuser('admin', 'admin@example.com', 'admin'))
+        self.dataset = Dataset.objects.create(name='iris')
+
+    def test_dataset_and_chunk(self):
+        chunk = Chunk.objects.create(dataset=self.dataset, service='csv',
+                                     raw_properties=json.dumps({'path': 'iris.csv'}))
+
+        for url in ('/datasets/%i/' % self.dataset.pk,
+                    '/datasets/%i/chunks/%i/' % (self.dataset.pk, chunk.pk)):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+
+                response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_dataset_without_chunks(self):
+        response = self.client.get('/datasets/%i/' % self.dataset.pk)
+        self.assertEqual(response.status_code, 200)
+
+
+class ChunkStreamTest(TestCase):
+    def setUp(self):
+        self.dataset = Dataset.objects.create(name='iris')
+        self.contents = {}
+
+        patcher = mock.patch.object(Chunk, 'build', lambda chunk: self.contents[chunk.pk])
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        chunk_cache.clear()
+        self.addCleanup(chunk_cache.clear)
+
+    def create(self, data, rows=None):
+        chunk = Chunk.objects.create(dataset=self.dataset, service='csv', raw_properties='{}',
+                                     rows=len(data) if rows is None else rows,
+                                     raw_schema=json.dumps(stats.column_types(data)))
+        self.contents[chunk.pk] = data
+        return chunk
+
+    def merged(self):
+        return ChunkStream(self.dataset.chunks.order_by('pk')).merged()
+
+    def test_merges_profiled_chunks(self):
+        a, b = np.arange(6.).reshape(3, 2), np.arange(4).reshape(2, 2)
+        self.create(a)
+        self.create(b)
+
+        np.testing.assert_array_equal(self.merged(), np.concatenate([a, b]))
+
+    def test_stale_row_counts_are_not_trusted(self):
+        a, b = np.arange(6.).reshape(3, 2), np.arange(2.).reshape(1, 2)
+        self.create(a)
+        self.create(b, rows=3)
+        np.testing.assert_array_equal(self.merged(), np.concatenate([a, b]))
+
+        self.dataset.chunks.update(rows=1)
+        np.testing.assert_array_equal(self.merged(), np.concatenate([a, b]))
+
+    def test_chunks_without_stats(self):
+        a, b = np.arange(6.).reshape(3, 2), np.arange(2.).reshape(1, 2)
+        self.create(a)
+        self.create(b)
+        self.dataset.chunks.update(rows=None, raw_schema='')
+
+        np.testing.assert_array_equal(self.merged(), np.concatenate([a, b]))
+
+    def test_single_chunks_are_copied(self):
+        a = np.arange(6.).reshape(3, 2)
+        a.flags.writeable = False
+        self.create(a)
+
+        merged = self.merged()
+        merged[0, 0] = -1
+        self.assertEqual(a[0, 0], 0)
+
+
+class IngestTest(TestCase):
+    @override_settings(CHUNK_STATS={'at_ingest': False})
+    def test_stats_are_forgotten_without_profiling(self):
+        chunk = Chunk.objects.create(dataset=Dataset.objects.create(name='iris'),
+                                     service='csv', raw_properties='{}', rows=3,
+                                     raw_schema='["float64"]', raw_stats='{}',
+                                     content_digest='digest')
+        ChunkViewSet().ingest(chunk)
+        chunk.refresh_from_db()
+
+        self.assertIsNone(chunk.rows)
+        self.assertEqual((chunk.raw_schema, chunk.raw_stats, chunk.content_digest), ('', '', ''))
+
+
+
+class Table(list):
+    """Rows parsed into a type of their own, which is not an array."""
+
+    def concatenate(self, parts):
+        return Table(row for part in parts for row in part)
+
+
+class MaterializeTest(TestCase):
+    def setUp(self):
+        self.dataset = Dataset.objects.create(name='iris')
+        self.contents = {}
+
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        for patcher in (mock.patch.object(chunks_fs, 'location', directory),
+                        mock.patch.object(IServiceTower, 'build',
+                                          lambda chunk: self.contents[chunk.pk])):
+            patcher.start()
+            self.addCleanup(patcher.stop)
+        chunk_cache.clear()
+        self.addCleanup(chunk_cache.clear)
+
+    def create(self, data):
+        chunk = Chunk.objects.create(dataset=self.dataset, service='csv', raw_properties='{}')
+        self.contents[chunk.pk] = data
+        return chunk
+
+    def test_materializes_parsed_content(self):
+        chunk = self.create(Table([[1., 2.], [3., 4.]]))
+        chunk.materialize()
+
+        self.assertTrue(chunk.is_materialized)
+        self.assertEqual(chunk.rows, 2)
+        np.testing.assert_array_equal(chunk.build(), [[1., 2.], [3., 4.]])
+
+    def test_refuses_content_which_is_not_numeric(self):
+        chunk = self.create([[{'a': 1}], [{'a': 2}]])
+
+        with self.assertRaises(ValueError):
+            chunk.materialize()
+        self.assertFalse(chunk.is_materialized)
+
+    def test_merges_materialized_and_parsed_chunks(self):
+        self.create(Table([[1., 2.]])).materialize()
+        self.create(Table([[3., 4.]]))
+
+        merged = ChunkStream(self.dataset.chunks.order_by('pk')).merged()
+        np.testing.assert_array_equal(merged, [[1., 2.], [3., 4.]])
@@ -0,0 +1,53 @@
+import os
+import uuid
+
+
+def copy_stream(read, f, block_size=1024 * 1024):
+    """Write the blocks returned by `read` into the file `f`, until exhausted."""
+    for block in iter(lambda: read(block_size), b''):
+        f.write(block)
+
+
+def split_lines(f, directory: str, service: str, rows: int, header: bool = True):
+    """Split an uploaded file into files of at most `rows` lines each.
+
+    CSV files have their header repeated on every part. JSON uploads are
+    read as JSON lines, and each part is written as an array of them. Lines
+    are copied as they are read, so the upload is never loaded in memory.
+
+    Yields the path and the number of rows of each part.
+    """
+    os.makedirs(directory, exist_ok=True)
+    prefix = os.path.join(directory, uuid.uuid4().hex)
+    first = f.readline() if service == 'csv' and header else b''
+    if first and not first.endswith(b'\n'):
+        first += b'\n'
+
+    lines = (line.rstrip(b'\r\n') for line in f)
+    lines = (line for line in lines if line.strip())
+    part, count, out = 0, 0, None
+
+    for line in lines:
+        if out is None:
+            path = '%s-%04i.%s' % (prefix, part, service)
+            out = open(path, 'wb')
+            out.write(first if service == 'csv' else b'[')
+        elif service != 'csv':
+            out.write(b',')
+
+        out.write(line + b'\n')
+        count += 1
+
+        if count == rows:
+            yield finish(out, service), count
+            part, count, out = part + 1, 0, None
+
+    if out is not None:
+        yield finish(out, service), count
+
+
+def finish(out, service):
+    if service != 'csv':
+        out.write(b']')
+    out.close()
+    return out.name
@@ -1,22 +1,150 @@
-from rest_framework import viewsets
+import json
+import os
+import tempfile
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework import status, viewsets
+from rest_framework.decorators import list_route
+from rest_framework.exceptions import ValidationError
+from rest_framework.parsers import MultiPartParser
+from rest_framework.response import Response
 from rest_framework_extensions.mixins import NestedViewSetMixin
 
-from .models import Dataset, Chunk
-from .serializers import DatasetSerializer, ChunkSerializer
+from mlswarm_api.views import ConditionalRetrieveMixin, FieldsMixin
+from . import services
+from .models import Dataset, Chunk, chunks_fs
+from .serializers import DatasetSerializer, ChunkSerializer, ChunkUploadSerializer
+from .uploads import copy_stream, split_lines
 
 
-class DatasetViewSet(viewsets.ModelViewSet):
+class DatasetViewSet(ConditionalRetrieveMixin,
+                     FieldsMixin,
+                     viewsets.ModelViewSet):
     queryset = (Dataset.objects
                 .prefetch_related('chunks')
                 .defer('chunks__raw_properties'))
     serializer_class = DatasetSerializer
+    conditional_related = ('chunks',)
 
 
 class ChunkViewSet(NestedViewSetMixin,
+                   ConditionalRetrieveMixin,
+                   FieldsMixin,
                    viewsets.ModelViewSet):
     queryset = Chunk.objects.all()
     serializer_class = ChunkSerializer
 
     def perform_create(self, serializer):
         q = self.get_parents_query_dict()
-        serializer.save(dataset_id=q['dataset'])
+        materialize = serializer.validated_data.pop('materialize', False)
+        with transaction.atomic():
+            serializer.save(dataset_id=q['dataset'])
+            self.ingest(serializer.instance, materialize)
+
+    def perform_update(self, serializer):
+        materialize = serializer.validated_data.pop('materialize', False)
+        with transaction.atomic():
+            serializer.save()
+            self.ingest(serializer.instance, materialize)
+
+    def ingest(self, chunk, materialize=False):
+        if materialize:
+            # Raised within the transaction saving the chunk, so it is not kept.
+            try:
+                chunk.materialize()
+            except Exception as e:
+                raise ValidationError({'materialize': [str(e)]})
+        elif settings.CHUNK_STATS.get('at_ingest', True):
+            chunk.try_profile()
+        else:
+            # Profiled later by the first task parsing it.
+            chunk.forget_profile()
+
+    def perform_destroy(self, instance):
+        instance.delete()
+        instance.dematerialize()
+        instance.discard_upload()
+
+    @list_route(methods=['post'], parser_classes=[MultiPartParser])
+    def upload(self, request, *args, **kwargs):
+        """Split a large CSV or JSON lines upload into many chunks.
+
+        The content is sent either as the `file` of a multipart form or as the
+        raw request body, with the options in the query string.
+        """
+        q = self.get_parents_query_dict()
+        dataset = Dataset.objects.get(pk=q['dataset'])
+        multipart = request.content_type.startswith('multipart/')
+
+        options = ChunkUploadSerializer(data=request.data if multipart
+                                        else request.query_params)
+        options.is_valid(raise_exception=True)
+        options = options.validated_data
+        rows = options.get('rows') or settings.CHUNK_UPLOADS.get('rows_per_chunk', 100000)
+
+        with tempfile.TemporaryFile() as f:
+            if multipart:
+                if 'file' not in request.FILES:
+                    raise ValidationError({'file': ['An uploaded file is expected.']})
+                # Large uploads were already streamed to disk by Django.
+                copy_stream(request.FILES['file'].read, f)
+            else:
+                # DRF has no stream for bodies without a length, e.g. chunked ones.
+                if request.stream is None:
+                    raise ValidationError({'file': ['The request body is empty or has no '
+                                                    'Content-Length.']})
+                copy_stream(request.stream.read, f)
+            f.seek(0)
+
+            parts = split_lines(f, chunks_fs.path(os.path.join('uploads', str(dataset.pk))),
+                                options['service'], rows, options['header'])
+            paths, chunks = [], []
+            try:
+                for path, _ in parts:
+                    paths.append(path)
+                with transaction.atomic():
+                    chunks, sample = self.create_chunks(dataset, paths, options)
+                    if options['materialize']:
+                        for chunk in chunks:
+                            self.ingest(chunk, materialize=True)
+                    elif settings.CHUNK_STATS.get('at_ingest', True):
+                        # The other chunks are profiled by the first task parsing them.
+                        chunks[0].try_profile(sample)
+            except Exception:
+                for chunk in chunks:
+                    chunk.dematerialize()
+                for path in paths:
+                    os.remove(path)
+                raise
+
+        return Response(ChunkSerializer(chunks, many=True, context={'request': request}).data,
+                        status=status.HTTP_201_CREATED)
+
+    def create_chunks(self, dataset, paths, options):
+        if not paths:
+            raise ValidationError({'file': ['The upload has no rows.']})
+
+        serializer_cls = services.parsers.get(options['service'])
+        chunks = []
+
+        for path in paths:
+            serializer = serializer_cls(data=dict(options['properties'], path=path))
+            if not serializer.is_valid():
+                raise ValidationError({'properties': serializer.errors})
+            if 'path' not in serializer.validated_data:
+                raise ValidationError({'service': ['The %s parser does not read files.'
+                                                   % options['service']]})
+            chunks.append(Chunk(dataset=dataset, service=options['service'],
+                                raw_properties=json.dumps(serializer.validated_data)))
+
+        # A sample is parsed before any chunk is created.
+        try:
+            sample = chunks[0].build()
+        except Exception as e:
+            raise ValidationError({'file': ['The content could not be parsed: %s' % e]})
+
+        with transaction.atomic():
+            for chunk in chunks:
+                chunk.save()
+        return chunks, sample
@@ -0,0 +1,114 @@
+import sys
+import threading
+from collections import OrderedDict
+
+
+def sizeof(value) -> int:
+    """Estimate the memory held by `value`, counting array buffers."""
+    nbytes = getattr(value, 'nbytes', None)
+    if isinstance(nbytes, int):
+        return nbytes
+
+    if hasattr(value, '__dict__'):
+        return sys.getsizeof(value) + sum(sizeof(v) for v in vars(value).values())
+
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(sizeof(v) for v in value)
+
+    return sys.getsizeof(value)
+
+
+class LRUCache:
+    """Thread-safe cache bounded by the total size of its entries.
+
+    The least recently used entries are evicted once `max_size` is
+    exceeded. The size of each entry is measured by the `sizeof`
+    function, and evicted values are passed to `on_evict`.
+    """
+
+    def __init__(self, max_size: int, sizeof=sizeof, on_evict=None):
+        self.max_size = max_size
+        self.sizeof = sizeof
+        self.on_evict = on_evict
+        self.size = 0
+        self.hits = self.misses = self.evictions = 0
+
+        self._entries = OrderedDict()
+        self._lock = threading.RLock()
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def items(self):
+        with self._lock:
+            return [(key, value) for key, (value, _) in self._entries.items()]
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value, _ = self._entries[key]
+            except KeyError:
+                self.misses += 1
+                return default
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        size = self.sizeof(value)
+
+        with self._lock:
+            self.pop(key)
+
+            if size > self.max_size:
+                return value
+
+            self._entries[key] = value, size
+            self.size += size
+
+            while self.size > self.max_size:
+                self.evict()
+
+        return value
+
+    def get_or_load(self, key, load):
+        missing = object()
+        value = self.get(key, missing)
+        return self.put(key, load()) if value is missing else value
+
+    def pop(self, key):
+        with self._lock:
+            value, size = self._entries.pop(key, (None, 0))
+            self.size -= size
+            return value
+
+    def evict(self):
+        with self._lock:
+            _, (value, size) = self._entries.popitem(last=False)
+            self.size -= size
+            self.evictions += 1
+
+        if self.on_evict:
+            self.on_evict(value)
+
+    def clear(self):
+        with self._lock:
+            while self._entries:
+                self.evict()
+
+    @property
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            'entries': len(self._entries),
+            'size': self.size,
+            'max_size': self.max_size,
+            'hits': self.hits,
+            'misses': self.misses,
+            'evictions': self.evictions,
+            'hit_rate': self.hits / lookups if lookups else None,
+        }
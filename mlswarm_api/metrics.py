@@ -0,0 +1,201 @@
+import bisect
+import os
+import threading
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+
+def _format_labels(names, values, extra=()):
+    pairs = list(zip(names, values)) + list(extra)
+    if not pairs:
+        return ''
+    return '{%s}' % ','.join('%s="%s"' % (k, str(v).replace('\\', r'\\').replace('"', r'\"'))
+                             for k, v in pairs)
+
+
+def _format_value(value):
+    return '+Inf' if value == float('inf') else repr(float(value))
+
+
+class Metric:
+    kind = None
+
+    def __init__(self, name: str, documentation: str, labels=()):
+        self.name = name
+        self.documentation = documentation
+        self.label_names = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def _key(self, labels: dict):
+        return tuple(str(labels.get(n, '')) for n in self.label_names)
+
+    def samples(self):
+        raise NotImplementedError
+
+    def render(self):
+        lines = ['# HELP %s %s' % (self.name, self.documentation),
+                 '# TYPE %s %s' % (self.name, self.kind)]
+        lines += ['%s%s %s' % (name, labels, _format_value(value))
+                  for name, labels, value in self.samples()]
+        return '\n'.join(lines)
+
+    def drain(self):
+        """Return the values gathered so far and reset them."""
+        with self._lock:
+            values, self._values = self._values, {}
+        return values
+
+    def merge(self, values):
+        raise NotImplementedError
+
+
+class Counter(Metric):
+    kind = 'counter'
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            return [(self.name, _format_labels(self.label_names, k), v)
+                    for k, v in sorted(self._values.items())]
+
+    def merge(self, values):
+        with self._lock:
+            for key, value in values.items():
+                self._values[key] = self._values.get(key, 0) + value
+
+
+class Gauge(Metric):
+    kind = 'gauge'
+
+    def set(self, value: float, **labels):
+        with self._lock:
+            self._values[self._key(labels)] = value
+
+    def clear(self):
+        with self._lock:
+            self._values = {}
+
+    samples = Counter.samples
+
+    def drain(self):
+        # Gauges hold current values, which are sent as they are.
+        with self._lock:
+            return dict(self._values)
+
+    def merge(self, values):
+        with self._lock:
+            self._values.update(values)
+
+
+class Histogram(Metric):
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, labels=(), buckets=DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labels)
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        with self._lock:
+            counts, total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+            counts[bisect.bisect_left(self.buckets, value)] += 1
+            self._values[key] = counts, total + value
+
+    def samples(self):
+        samples = []
+        with self._lock:
+            for key, (counts, total) in sorted(self._values.items()):
+                cumulative = 0
+                for bound, count in zip(self.buckets, counts):
+                    cumulative += count
+                    samples.append((self.name + '_bucket',
+                                    _format_labels(self.label_names, key,
+                                                   [('le', _format_value(bound))]),
+                                    cumulative))
+                samples.append((self.name + '_count',
+                                _format_labels(self.label_names, key), cumulative))
+                samples.append((self.name + '_sum',
+                                _format_labels(self.label_names, key), total))
+        return samples
+
+    def merge(self, values):
+        with self._lock:
+            for key, (counts, total) in values.items():
+                current, current_total = self._values.get(key, ([0] * len(self.buckets), 0.0))
+                self._values[key] = ([a + b for a, b in zip(current, counts)],
+                                     current_total + total)
+
+
+class Registry:
+    """The metrics of a process, rendered in Prometheus' text format.
+
+    Processes whose metrics cannot be scraped, such as the worker's child
+    processes, `drain` their values and send them to a process that can,
+    which `merge`s them into its own registry. `collectors` are called
+    before rendering, to refresh the values read from elsewhere.
+    """
+
+    def __init__(self):
+        self.metrics = {}
+        self.collectors = []
+        self._lock = threading.Lock()
+
+    def collector(self, fn):
+        self.collectors.append(fn)
+        return fn
+
+    def collect(self):
+        for fn in self.collectors:
+            fn()
+
+    def register(self, metric: Metric) -> Metric:
+        with self._lock:
+            return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labels=()):
+        return self.register(Counter(name, documentation, labels))
+
+    def gauge(self, name, documentation, labels=()):
+        return self.register(Gauge(name, documentation, labels))
+
+    def histogram(self, name, documentation, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, documentation, labels, buckets))
+
+    def render(self):
+        self.collect()
+        return '\n'.join(m.render() for _, m in sorted(self.metrics.items())) + '\n'
+
+    def drain(self):
+        return {name: metric.drain() for name, metric in self.metrics.items()}
+
+    def merge(self, drained: dict):
+        for name, values in drained.items():
+            if name in self.metrics and values:
+                self.metrics[name].merge(values)
+
+
+registry = Registry()
+
+http_requests = registry.histogram(
+    'mlswarm_http_request_duration_seconds',
+    'Latency of the API requests.',
+    labels=('view', 'method', 'status'))
+
+cache_stats = registry.gauge(
+    'mlswarm_cache',
+    'Entries, size, hits, misses and evictions of the in-process caches.',
+    labels=('cache', 'process', 'stat'))
+
+
+def observe_cache(cache, name: str):
+    """Publish the stats of a `LRUCache` of this process on the registry."""
+    stats = cache.stats
+    for key in ('entries', 'size', 'hits', 'misses', 'evictions'):
+        cache_stats.set(stats[key], cache=name, process=os.getpid(), stat=key)
@@ -0,0 +1,22 @@
+import time
+
+from .metrics import http_requests
+
+
+class MetricsMiddleware:
+    """Measures the latency of each request, by view, method and status."""
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        started = time.perf_counter()
+        response = self.get_response(request)
+
+        match = getattr(request, 'resolver_match', None)
+        view = (getattr(match.func, 'cls', match.func).__name__
+                if match is not None else 'unresolved')
+        http_requests.observe(time.perf_counter() - started,
+                              view=view, method=request.method,
+                              status=response.status_code)
+        return response
@@ -34,12 +34,15 @@ class IServiceTower(IDynamicProperties):
     service = None
     services = None
 
-    @cached_property
-    def loaded(self):
+    def build(self):
         serializer_cls = self.services.get(self.service)
         serializer = serializer_cls(data=self.properties)
         serializer.is_valid(raise_exception=True)
         return serializer.save()
 
+    @cached_property
+    def loaded(self):
+        return self.build()
+
     class Meta:
         abstract = True
@@ -0,0 +1,9 @@
+from rest_framework import pagination
+
+
+class CursorPagination(pagination.CursorPagination):
+    # Newest first. Unlike offsets, cursors are resolved through the primary
+    # key index, no matter how deep the page is.
+    ordering = '-id'
+    page_size_query_param = 'page_size'
+    max_page_size = 500
@@ -5,7 +5,7 @@ from django.contrib.auth.models import User, Group
 from rest_framework import serializers
 from rest_framework.serializers import (Serializer, ModelSerializer, HyperlinkedModelSerializer)
 
-from mlswarm.infrastructure.services import ServiceBuilder
+from .services import LazyServiceBuilder
 
 
 class UserSerializer(HyperlinkedModelSerializer):
@@ -24,12 +24,20 @@ class UserSerializer(HyperlinkedModelSerializer):
 
 
 class PropertiesSerializerMixin:
-    services: ServiceBuilder = None
+    services: LazyServiceBuilder = None
 
     def service_serializer_cls(self, data: dict) -> ClassVar[Serializer]:
         assert self.services is not None, ('%s does not have a valid builder.' % self)
         return self.services.get(data['service'])
 
+    def split_options(self, properties):
+        """Separate the properties handled by the entity itself from the service's.
+
+        Returns the service's properties and the validated options, or `None`
+        if the entity takes no options.
+        """
+        return properties, None
+
     def validate(self, data: dict) -> dict:
         try:
             properties = (json.loads(data['properties'])
@@ -40,6 +48,7 @@ class PropertiesSerializerMixin:
                 'properties': ['Value must be valid JSON: %s' % str(e)]
             })
 
+        properties, options = self.split_options(properties)
         serializer = self.service_serializer_cls(data)(data=properties)
         assert isinstance(serializer, Serializer), (
             'Service %s\'s schema should be a valid Serializer class instance.'
@@ -52,6 +61,8 @@ class PropertiesSerializerMixin:
             })
 
         data['raw_properties'] = json.dumps(serializer.validated_data)
+        if options is not None:
+            data['raw_options'] = json.dumps(options)
         del data['properties']
 
         return data
@@ -0,0 +1,29 @@
+from django.utils.module_loading import import_string
+
+
+class LazyServiceBuilder:
+    """Registry of services given by dotted paths, imported on first use.
+
+    Listing the services (e.g. as model choices) imports nothing, so processes
+    which never use a service don't load the libraries behind it.
+    """
+
+    def __init__(self, services: dict):
+        self.paths = dict(services)
+        self._loaded = {}
+
+    def __contains__(self, name):
+        return name in self.paths
+
+    def get(self, name: str):
+        if name not in self._loaded:
+            try:
+                path = self.paths[name]
+            except KeyError:
+                raise ValueError('Unknown service %s. Options are: %s.'
+                                 % (name, ', '.join(sorted(self.paths))))
+            self._loaded[name] = import_string(path)
+        return self._loaded[name]
+
+    def to_choices(self):
+        return tuple((name, name) for name in self.paths)
@@ -43,6 +43,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'mlswarm_api.middleware.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -84,6 +85,13 @@ DATABASES = {
 }
 
 
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
 # Password validation
 # https://docs.djangoproject.com/en/1.11/ref/settings/#auth-password-validators
 
@@ -134,7 +142,124 @@ REST_FRAMEWORK = {
     # or allow read-only access for unauthenticated users.
     'DEFAULT_PERMISSION_CLASSES': [
         'rest_framework.permissions.DjangoModelPermissions',
-    ]
+    ],
+    'DEFAULT_PAGINATION_CLASS': 'mlswarm_api.pagination.CursorPagination',
+    'PAGE_SIZE': 50,
+}
+
+# Task Workers
+TASK_WORKERS = {
+    # Maximum number of tasks running at once in a worker.
+    'processes': os.cpu_count(),
+    # Port on which the worker serves the metrics of its tasks. Disabled if None.
+    'metrics_port': None,
+    # Tasks served by each worker process before it is replaced.
+    'max_tasks_per_child': 100,
+    # Seconds between checks for new tasks.
+    'poll_interval': 1.0,
+    # The name identifying the worker on task leases. Defaults to `host:pid`.
+    'name': None,
+    # Seconds without heartbeats after which a worker's tasks are taken over.
+    'lease_ttl': 60,
+    # Maximum number of tasks running at once, per estimator service.
+    'concurrency': {
+        'simple-dense-network-classifier': 2,
+    },
+    # Seconds a cancelled task has to stop before its process is killed.
+    'cancel_grace': 30,
+    # Cpus and memory (in MiB) shared by the tasks of a worker. Default to the machine's.
+    'cpus': None,
+    'memory': None,
+}
+
+# Cpus and memory (in MiB) reserved for each task, by estimator service. Tasks may
+# override them with the `cpus` and `memory` options.
+TASK_RESOURCES = {
+    'default': {'cpus': 1, 'memory': 1024},
+    'simple-dense-network-classifier': {'cpus': 2, 'memory': 4096},
+}
+
+# Outputs of the tasks
+TASK_OUTPUTS = {
+    # Outputs larger than this many characters are stored in compressed files, and
+    # only their summaries are kept in the database.
+    'inline_limit': 64 * 1024,
+}
+
+# Content-addressed store of the files saved by trainings, from which any worker can
+# fetch a training's model.
+ARTIFACTS = {
+    # Either `predictions.artifacts.LocalArtifactStore` or `S3ArtifactStore`.
+    'store': 'predictions.artifacts.LocalArtifactStore',
+    'options': {'location': 'artifacts/'},
+    # Days after which artifacts are removed by `prune_artifacts`. Never, if None.
+    'retention': {
+        # Trainings which failed, were cancelled or interrupted.
+        'failed': 7,
+        'completed': None,
+        # Local copies of stored models, since they were last used.
+        'local': 30,
+    },
+}
+
+# `predictions.instrumentation.TaskHook`s receiving the timings of every task.
+TASK_HOOKS = [
+    'predictions.instrumentation.MetricsHook',
+]
+
+# Hyperparameter sweeps
+SWEEPS = {
+    # Maximum number of trainings created by a single sweep.
+    'max_trainings': 1000,
+}
+
+# Parsed chunks kept in memory by each process, shared among its tasks.
+CHUNK_CACHE = {
+    # Memory budget, in bytes.
+    'max_size': 512 * 1024 ** 2,
+}
+
+# Statistics computed when chunks are created or updated. Only the first chunk of
+# a bulk upload is profiled then, and the others by the first task parsing them.
+CHUNK_STATS = {
+    'at_ingest': True,
+    'label_column': -1,
+    # Label columns with more distinct values have no histogram.
+    'max_labels': 100,
+}
+
+CHUNK_UPLOADS = {
+    'rows_per_chunk': 100000,
+}
+
+# Representations of finished tasks, kept by `ConditionalRetrieveMixin`.
+# Keys change with the instances, so stale entries are never served.
+RESPONSE_CACHE = {
+    'cache': 'default',
+    'timeout': 3600,
+}
+
+# Long-polling and server-sent events of task statuses, in seconds.
+STATUS_EVENTS = {
+    'poll_interval': 0.5,
+    'max_wait': 30,
+    'heartbeat': 15,
+    'stream_duration': 300,
+    # Event streams open at once in each API process. Every stream holds a thread
+    # for `stream_duration` seconds, so servers with a single thread per process
+    # (e.g., sync workers) should rely on the status route instead.
+    'max_streams': 8,
+    'retention': 86400,
+}
+
+# Online predictions
+INFERENCE = {
+    # Estimators kept loaded in memory by each API process.
+    'max_models': 8,
+    # Concurrent requests for the same model are predicted together, in
+    # batches of up to `max_batch_size` rows, gathered for up to `max_wait` seconds.
+    'max_batch_size': 256,
+    'max_wait': 0.005,
 }
 
 ### API Docs
@@ -18,11 +18,17 @@ router.register('users', root_views.UserViewSet)
               parents_query_lookups=['dataset'],
               base_name='dataset-chunks'))
 
-t_router = (router
-            .register('estimators', p_views.EstimatorViewSet, base_name='estimator')
-            .register('trainings', p_views.TrainingViewSet,
-                      parents_query_lookups=['estimator'],
-                      base_name='training'))
+e_router = router.register('estimators', p_views.EstimatorViewSet, base_name='estimator')
+e_router.register('sweeps', p_views.SweepViewSet,
+                  parents_query_lookups=['estimator'],
+                  base_name='sweep')
+e_router.register('cross-validations', p_views.CrossValidationViewSet,
+                  parents_query_lookups=['estimator'],
+                  base_name='cross-validation')
+
+t_router = e_router.register('trainings', p_views.TrainingViewSet,
+                             parents_query_lookups=['estimator'],
+                             base_name='training')
 t_router.register('tests', p_views.TestViewSet,
                   parents_query_lookups=['estimator', 'training'],
                   base_name='test')
@@ -34,6 +40,7 @@ urlpatterns = [
                   url('^', include(router.urls)),
                   url('^api-auth/', include('rest_framework.urls', namespace='rest_framework')),
                   url('^admin/', admin.site.urls),
+                  url('^metrics$', root_views.metrics, name='metrics'),
                   url('^docs/', include_docs_urls(title=settings.DOCS.get('title', None),
                                                   description=settings.DOCS.get('description', None))),
               ] + static(settings.STATIC_URL, document_root=settings.STATIC_ROOT)
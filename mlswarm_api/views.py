@@ -1,11 +1,101 @@
+import hashlib
+
+from django.conf import settings
 from django.contrib.auth.models import User
-from rest_framework import viewsets
+from django.core.cache import caches
+from django.db.models import Count, Max
+from django.http import Http404, HttpResponse
+from django.utils.http import http_date, parse_http_date_safe, quote_etag
+from rest_framework import status, viewsets
+from rest_framework.response import Response
+from rest_framework.serializers import ListSerializer
 
 from . import serializers
+from .metrics import CONTENT_TYPE, registry
+
+
+class FieldsMixin:
+    """Trims the representations to the comma-separated list in `?fields=`."""
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        fields = self.request.query_params.get('fields') if self.request else None
+
+        if fields and self.request.method == 'GET':
+            target = serializer.child if isinstance(serializer, ListSerializer) else serializer
+            for name in set(target.fields) - set(fields.split(',')):
+                target.fields.pop(name)
+
+        return serializer
+
+
+class ConditionalRetrieveMixin:
+    """Answers conditional GETs of unchanged instances with 304 Not Modified.
+
+    The version of an instance is read with a single aggregate over its
+    `updated_at` and those of the `conditional_related` relations (plus
+    their counts, so removals are noticed), before anything is serialized.
+    Representations of instances whose status is in `cached_statuses` are
+    also kept in the response cache, under keys derived from that version.
+    """
+    conditional_related = ()
+    cached_statuses = ()
+
+    def get_version(self):
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        queryset = (self.get_queryset()
+                    .prefetch_related(None)
+                    .filter(**{self.lookup_field: self.kwargs[lookup_url_kwarg]}))
 
+        aggregates = {'updated_at': Max('updated_at')}
+        for name in self.conditional_related:
+            aggregates[name + '_updated_at'] = Max(name + '__updated_at')
+            aggregates[name + '_count'] = Count(name, distinct=True)
+        if self.cached_statuses:
+            aggregates['status'] = Max('status')
 
-class UserViewSet(viewsets.ReadOnlyModelViewSet):
+        version = queryset.aggregate(**aggregates)
+        if version['updated_at'] is None:
+            raise Http404
+        return version
+
+    def retrieve(self, request, *args, **kwargs):
+        version = self.get_version()
+        last_modified = max(v for k, v in version.items()
+                            if (k == 'updated_at' or k.endswith('_updated_at'))
+                            and v is not None)
+        etag = quote_etag(hashlib.md5(('%s:%s:%s' % (
+            type(self).__name__, sorted(version.items()), request.GET.urlencode())
+        ).encode()).hexdigest())
+
+        headers = {'ETag': etag, 'Last-Modified': http_date(last_modified.timestamp())}
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH')
+        if_modified_since = parse_http_date_safe(request.META.get('HTTP_IF_MODIFIED_SINCE', ''))
+
+        if (if_none_match and (if_none_match.strip() == '*' or etag in if_none_match)
+                or not if_none_match and if_modified_since
+                and if_modified_since >= int(last_modified.timestamp())):
+            return Response(status=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+        cache = caches[settings.RESPONSE_CACHE.get('cache', 'default')]
+        cacheable = version.get('status') in self.cached_statuses
+        data = cache.get('response:' + etag) if cacheable else None
+
+        if data is None:
+            data = self.get_serializer(self.get_object()).data
+            if cacheable:
+                cache.set('response:' + etag, data, settings.RESPONSE_CACHE.get('timeout'))
+
+        return Response(data, headers=headers)
+
+
+class UserViewSet(FieldsMixin,
+                  viewsets.ReadOnlyModelViewSet):
     queryset = (User.objects
                 .prefetch_related('groups')
                 .only('username', 'email', 'is_staff', 'groups__name'))
     serializer_class = serializers.UserSerializer
+
+
+def metrics(request):
+    return HttpResponse(registry.render(), content_type=CONTENT_TYPE)
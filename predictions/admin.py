@@ -5,4 +5,8 @@ from . import models
 admin.site.register(models.Training)
 admin.site.register(models.Test)
 admin.site.register(models.Predict)
+admin.site.register(models.CrossValidation)
 admin.site.register(models.Estimator)
+admin.site.register(models.Sweep)
+admin.site.register(models.Lease)
+admin.site.register(models.StatusEvent)
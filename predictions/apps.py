@@ -4,3 +4,11 @@ from django.db.models import signals
 
 class PredictionsConfig(AppConfig):
     name = 'predictions'
+
+    def ready(self):
+        from mlswarm_api.metrics import registry, observe_cache
+        from .inference import models_cache
+        from .instrumentation import collect_tasks
+
+        registry.collector(collect_tasks)
+        registry.collector(lambda: observe_cache(models_cache.cache, 'models'))
@@ -0,0 +1,201 @@
+import hashlib
+import io
+import os
+import shutil
+import uuid
+from functools import lru_cache
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+BLOCK_SIZE = 1024 * 1024
+
+
+def digest_file(path: str):
+    h = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(BLOCK_SIZE), b''):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ArtifactStore:
+    """Keeps the files produced by trainings, addressed by the digest of their content.
+
+    Identical files are stored once, however many trainings produced them.
+    Stores are listed as a dotted path in `ARTIFACTS['store']`, and built
+    with the keyword arguments in `ARTIFACTS['options']`.
+    """
+
+    def exists(self, digest: str) -> bool:
+        raise NotImplementedError
+
+    def upload(self, digest: str, path: str):
+        raise NotImplementedError
+
+    def download(self, digest: str, path: str):
+        raise NotImplementedError
+
+    def delete(self, digest: str):
+        raise NotImplementedError
+
+    def digests(self):
+        """Iterate over the digests of all stored files."""
+        raise NotImplementedError
+
+    def put(self, path: str) -> str:
+        digest = digest_file(path)
+        if not self.exists(digest):
+            self.upload(digest, path)
+        return digest
+
+    def get(self, digest: str, path: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = '%s.%s.tmp' % (path, uuid.uuid4().hex)
+
+        # Files only become visible once completely written.
+        try:
+            self.download(digest, tmp)
+            os.replace(tmp, path)
+        finally:
+            if os.path.exists(tmp):
+                os.remove(tmp)
+
+    def push(self, directory: str, exclude=()):
+        """Store the files of a directory, returning its manifest.
+
+        The manifest maps the path of each file, relative to `directory`,
+        to the digest of its content.
+        """
+        manifest = {}
+        for root, dirs, files in os.walk(directory):
+            dirs[:] = [d for d in dirs if os.path.join(root, d) not in exclude]
+            for name in files:
+                path = os.path.join(root, name)
+                manifest[os.path.relpath(path, directory)] = self.put(path)
+        return manifest
+
+    def pull(self, manifest: dict, directory: str):
+        """Fetch the files of a manifest which are missing from `directory`."""
+        for name, digest in manifest.items():
+            path = os.path.join(directory, name)
+            if not os.path.exists(path):
+                self.get(digest, path)
+
+
+class LocalArtifactStore(ArtifactStore):
+    def __init__(self, location: str = 'artifacts/'):
+        self.location = os.path.abspath(location)
+
+    def path(self, digest: str):
+        return os.path.join(self.location, digest[:2], digest)
+
+    def exists(self, digest):
+        return os.path.exists(self.path(digest))
+
+    def upload(self, digest, path):
+        target = self.path(digest)
+        os.makedirs(os.path.dirname(target), exist_ok=True)
+        tmp = '%s.%s.tmp' % (target, uuid.uuid4().hex)
+        shutil.copyfile(path, tmp)
+        os.replace(tmp, target)
+
+    def download(self, digest, path):
+        shutil.copyfile(self.path(digest), path)
+
+    def delete(self, digest):
+        if self.exists(digest):
+            os.remove(self.path(digest))
+
+    def digests(self):
+        if not os.path.isdir(self.location):
+            return
+        for prefix in os.listdir(self.location):
+            for name in os.listdir(os.path.join(self.location, prefix)):
+                if not name.endswith('.tmp'):
+                    yield name
+
+
+class S3ArtifactStore(ArtifactStore):
+    """Stores artifacts in a bucket of an S3-compatible service.
+
+    `client` is the dotted path of a callable building the client, which
+    defaults to a `boto3` client for `endpoint_url`.
+    """
+
+    def __init__(self, bucket: str, prefix: str = 'artifacts/', client: str = None,
+                 endpoint_url: str = None):
+        self.bucket = bucket
+        self.prefix = prefix
+        if client is not None:
+            self.client = import_string(client)()
+        else:
+            import boto3
+            self.client = boto3.client('s3', endpoint_url=endpoint_url)
+
+    def key(self, digest: str):
+        return self.prefix + digest
+
+    def exists(self, digest):
+        response = self.client.list_objects_v2(Bucket=self.bucket, Prefix=self.key(digest),
+                                               MaxKeys=1)
+        return any(o['Key'] == self.key(digest) for o in response.get('Contents', ()))
+
+    def upload(self, digest, path):
+        with open(path, 'rb') as f:
+            self.client.upload_fileobj(f, self.bucket, self.key(digest))
+
+    def download(self, digest, path):
+        with open(path, 'wb') as f:
+            self.client.download_fileobj(self.bucket, self.key(digest), f)
+
+    def delete(self, digest):
+        self.client.delete_object(Bucket=self.bucket, Key=self.key(digest))
+
+    def digests(self):
+        options = {'Bucket': self.bucket, 'Prefix': self.prefix}
+        while True:
+            response = self.client.list_objects_v2(**options)
+            for o in response.get('Contents', ()):
+                yield o['Key'][len(self.prefix):]
+
+            if not response.get('IsTruncated'):
+                break
+            options['ContinuationToken'] = response['NextContinuationToken']
+
+
+class InMemoryS3Client:
+    """A stand-in for the few S3 client methods used by `S3ArtifactStore`.
+
+    Objects are kept in the memory of the process, so it is only meant for
+    trying out the store, e.g. in tests.
+    """
+
+    def __init__(self):
+        self.objects = {}
+
+    def list_objects_v2(self, Bucket, Prefix='', MaxKeys=1000, ContinuationToken=None):
+        keys = sorted(k for b, k in self.objects if b == Bucket and k.startswith(Prefix))
+        start = int(ContinuationToken or 0)
+        page = keys[start:start + MaxKeys]
+        response = {'Contents': [{'Key': k} for k in page],
+                    'KeyCount': len(page),
+                    'IsTruncated': start + MaxKeys < len(keys)}
+        if response['IsTruncated']:
+            response['NextContinuationToken'] = str(start + MaxKeys)
+        return response
+
+    def upload_fileobj(self, f, Bucket, Key):
+        self.objects[Bucket, Key] = f.read()
+
+    def download_fileobj(self, Bucket, Key, f):
+        shutil.copyfileobj(io.BytesIO(self.objects[Bucket, Key]), f)
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+
+
+@lru_cache()
+def store() -> ArtifactStore:
+    options = settings.ARTIFACTS
+    return import_string(options['store'])(**options.get('options', {}))
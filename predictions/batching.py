@@ -0,0 +1,182 @@
+import queue
+import threading
+import time
+from collections import deque
+from concurrent.futures import Future
+
+
+class BatchStats:
+    """Throughput and latency of the requests answered by a `MicroBatcher`."""
+
+    def __init__(self, window: int = 1000):
+        self.requests = self.batches = self.rows = 0
+        self.latencies = deque(maxlen=window)
+        self.finished = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, latencies, rows):
+        now = time.monotonic()
+        with self._lock:
+            self.requests += len(latencies)
+            self.batches += 1
+            self.rows += rows
+            self.latencies.extend(latencies)
+            self.finished.extend(now for _ in latencies)
+
+    def percentile(self, p):
+        latencies = sorted(self.latencies)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(p / 100 * len(latencies)))]
+
+    @property
+    def throughput(self):
+        if len(self.finished) < 2:
+            return None
+        elapsed = self.finished[-1] - self.finished[0]
+        return len(self.finished) / elapsed if elapsed else None
+
+    def as_dict(self):
+        with self._lock:
+            return {
+                'requests': self.requests,
+                'batches': self.batches,
+                'mean_batch_size': self.requests / self.batches if self.batches else None,
+                'mean_batch_rows': self.rows / self.batches if self.batches else None,
+                'throughput': self.throughput,
+                'latency_p50': self.percentile(50),
+                'latency_p99': self.percentile(99),
+            }
+
+
+class Request:
+    def __init__(self, data):
+        self.data = data
+        self.future = Future()
+        self.received_at = time.monotonic()
+
+
+def split(result, offsets):
+    """Split the `result` of a batched prediction into the results of each request.
+
+    Sequences with one entry per row, and dicts of such sequences, are
+    split. `None` is returned when `result` cannot be split.
+    """
+    total = offsets[-1]
+
+    if isinstance(result, dict):
+        parts = {k: split(v, offsets) for k, v in result.items()}
+        if any(v is None for v in parts.values()):
+            return None
+        return [{k: v[i] for k, v in parts.items()} for i in range(len(offsets) - 1)]
+
+    if hasattr(result, '__len__') and not isinstance(result, str) and len(result) == total:
+        parts = [result[a:b] for a, b in zip(offsets, offsets[1:])]
+        return [p.tolist() if hasattr(p, 'tolist') else list(p) for p in parts]
+
+    return None
+
+
+class MicroBatcher:
+    """Groups concurrent predictions for the same model into a single `predict` call.
+
+    Requests are collected until `max_batch_size` rows are gathered or the
+    first request has waited `max_wait` seconds. Requests queued before the
+    batcher is stopped are still answered, and the ones made after it are
+    predicted on their own.
+    """
+
+    def __init__(self, predict, max_batch_size: int, max_wait: float):
+        self.predict_fn = predict
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self.stats = BatchStats()
+        self.stopped = False
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._thread = threading.Thread(target=self._loop, daemon=True)
+        self._thread.start()
+
+    def predict(self, data, timeout: float = None):
+        request = Request(data)
+
+        # Requests are never queued after the stop marker, which ends the loop.
+        with self._lock:
+            if self.stopped:
+                return self.predict_fn(data)
+            self._queue.put(request)
+
+        return request.future.result(timeout)
+
+    def stop(self):
+        with self._lock:
+            if not self.stopped:
+                self.stopped = True
+                self._queue.put(None)
+
+    def _collect(self):
+        first = self._queue.get()
+        if first is None:
+            return None
+
+        batch, rows = [first], len(first.data)
+        deadline = first.received_at + self.max_wait
+
+        while rows < self.max_batch_size:
+            try:
+                request = self._queue.get(timeout=max(deadline - time.monotonic(), 0))
+            except queue.Empty:
+                break
+
+            if request is None:
+                self._queue.put(None)
+                break
+
+            batch.append(request)
+            rows += len(request.data)
+
+        return batch
+
+    def _loop(self):
+        while True:
+            batch = self._collect()
+            if batch is None:
+                return
+
+            self._run(batch)
+            finished_at = time.monotonic()
+            self.stats.record([finished_at - r.received_at for r in batch],
+                              sum(len(r.data) for r in batch))
+
+    def _run(self, batch):
+        results = self._predict_together(batch) if len(batch) > 1 else None
+
+        if results is not None:
+            for request, result in zip(batch, results):
+                request.future.set_result(result)
+            return
+
+        # Errors only fail the request which caused them.
+        for request in batch:
+            try:
+                request.future.set_result(self.predict_fn(request.data))
+            except Exception as e:
+                request.future.set_exception(e)
+
+    def _predict_together(self, batch):
+        """Predict the rows of all requests at once, or `None` if they cannot be."""
+        import numpy as np
+
+        try:
+            data = np.concatenate([r.data for r in batch])
+        except ValueError:
+            # The rows of some requests have a different width.
+            return None
+
+        offsets = np.cumsum([0] + [len(r.data) for r in batch]).tolist()
+        try:
+            # `None` if the estimator's output is not per row.
+            return split(self.predict_fn(data), offsets)
+        except Exception:
+            return None
@@ -0,0 +1,39 @@
+import signal
+import threading
+from contextlib import contextmanager
+
+
+class TaskCancelled(BaseException):
+    """Raised inside a running task when it is cancelled or times out.
+
+    Like `KeyboardInterrupt`, it is not an `Exception`, so estimators that
+    catch every error do not swallow it.
+    """
+
+
+@contextmanager
+def cancellable(timeout: float = None):
+    """Raise `TaskCancelled` within the block on SIGTERM, or after `timeout` seconds.
+
+    Signals can only be handled by the main thread, so the block is not
+    interrupted when run elsewhere.
+    """
+    if threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def cancel(signum, frame):
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        if signum == signal.SIGALRM:
+            raise TaskCancelled('The task timed out after %s seconds.' % timeout)
+        raise TaskCancelled('The task was cancelled.')
+
+    previous = signal.signal(signal.SIGTERM, cancel), signal.signal(signal.SIGALRM, cancel)
+    if timeout:
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGTERM, previous[0])
+        signal.signal(signal.SIGALRM, previous[1])
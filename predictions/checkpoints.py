@@ -0,0 +1,68 @@
+import os
+import shutil
+import time
+from collections import namedtuple
+
+Checkpoint = namedtuple('Checkpoint', ['step', 'path', 'saved_at'])
+
+
+class Checkpoints:
+    """The checkpoints of a training, kept in one directory per step.
+
+    Estimators which declare `accepts_checkpoints` receive a callback from
+    `saver` and call it with the current step (e.g., the epoch) as they
+    train. Checkpoints are written at most once every `interval` seconds,
+    and only the `keep` latest are kept.
+    """
+
+    def __init__(self, directory: str, interval: float = 0, keep: int = 2):
+        self.directory = directory
+        self.interval = interval
+        self.keep = keep
+
+    def all(self):
+        if not os.path.isdir(self.directory):
+            return []
+
+        checkpoints = []
+        for name in os.listdir(self.directory):
+            if not name.startswith('step-') or name.endswith('.tmp'):
+                continue
+            path = os.path.join(self.directory, name)
+            checkpoints.append(Checkpoint(int(name[len('step-'):]), path,
+                                          os.path.getmtime(path)))
+        return sorted(checkpoints)
+
+    def latest(self):
+        checkpoints = self.all()
+        return checkpoints[-1] if checkpoints else None
+
+    def save(self, estimator, step: int):
+        path = os.path.join(self.directory, 'step-%08i' % step)
+        if os.path.exists(path + '.tmp'):
+            shutil.rmtree(path + '.tmp')
+        os.makedirs(path + '.tmp')
+
+        # Checkpoints only become visible once completely written.
+        estimator.save(path + '.tmp')
+        if os.path.exists(path):
+            shutil.rmtree(path)
+        os.replace(path + '.tmp', path)
+
+        for checkpoint in self.all()[:-self.keep]:
+            shutil.rmtree(checkpoint.path)
+
+    def saver(self, estimator):
+        last = time.monotonic()
+
+        def checkpoint(step: int, force: bool = False):
+            nonlocal last
+            if force or time.monotonic() - last >= self.interval:
+                self.save(estimator, step)
+                last = time.monotonic()
+
+        return checkpoint
+
+    def discard(self):
+        if os.path.exists(self.directory):
+            shutil.rmtree(self.directory)
@@ -0,0 +1,106 @@
+import json
+import threading
+
+from django.conf import settings
+
+from mlswarm_api.caches import LRUCache
+from .batching import MicroBatcher
+
+
+class LoadedModel:
+    """An estimator loaded for online predictions, and the lock serializing them."""
+
+    def __init__(self, estimator):
+        self.estimator = estimator
+        self.lock = threading.Lock()
+        self.disposed = False
+
+
+def _dispose(model: LoadedModel):
+    with model.lock:
+        model.disposed = True
+        model.estimator.dispose()
+
+
+class ModelCache:
+    """Estimators loaded from completed trainings, kept in memory for online predictions.
+
+    Entries are keyed by training id and finishing time, so a training that
+    runs again is reloaded. At most `max_models` estimators are kept, and
+    the least recently used are disposed first.
+
+    Concurrent predictions with the same model and properties are grouped
+    by a `MicroBatcher` when `max_batch_size` is greater than one.
+    """
+
+    def __init__(self, max_models: int, max_batch_size: int = 1, max_wait: float = 0.0):
+        self.cache = LRUCache(max_models, sizeof=lambda model: 1, on_evict=_dispose)
+        self.batchers = LRUCache(4 * max_models, sizeof=lambda batcher: 1,
+                                 on_evict=MicroBatcher.stop)
+        self.max_batch_size = max_batch_size
+        self.max_wait = max_wait
+        self._loading = threading.Lock()
+
+    @staticmethod
+    def key(training):
+        return training.pk, training.finished_at
+
+    def get(self, training) -> LoadedModel:
+        key = self.key(training)
+        model = self.cache.get(key)
+
+        if model is None:
+            # Concurrent requests for a cold model load it only once.
+            with self._loading:
+                model = self.cache.get_or_load(key, lambda: self.load(training))
+
+        return model
+
+    def load(self, training) -> LoadedModel:
+        estimator = training.estimator.build().load(training.ensure_local())
+        return LoadedModel(estimator)
+
+    def warm(self, *trainings):
+        for training in trainings:
+            self.get(training)
+
+    def _predict(self, training, data, properties):
+        while True:
+            model = self.get(training)
+
+            with model.lock:
+                # Models evicted since they were fetched are loaded again.
+                if not model.disposed:
+                    return model.estimator.predict(data, report_dir=None, **properties)
+
+    def batcher(self, training, properties) -> MicroBatcher:
+        key = self.key(training) + (json.dumps(properties, sort_keys=True),)
+
+        with self._loading:
+            return self.batchers.get_or_load(key, lambda: MicroBatcher(
+                lambda data: self._predict(training, data, properties),
+                self.max_batch_size, self.max_wait))
+
+    def predict(self, training, data, **properties):
+        if self.max_batch_size <= 1:
+            return self._predict(training, data, properties)
+        return self.batcher(training, properties).predict(data)
+
+    def batch_stats(self, training):
+        return [dict(properties=json.loads(key[-1]), **batcher.stats.as_dict())
+                for key, batcher in self.batchers.items()
+                if key[:2] == self.key(training)]
+
+    def evict(self, training):
+        model = self.cache.pop(self.key(training))
+        if model is not None:
+            _dispose(model)
+
+    @property
+    def stats(self):
+        return self.cache.stats
+
+
+models_cache = ModelCache(settings.INFERENCE.get('max_models', 8),
+                          settings.INFERENCE.get('max_batch_size', 1),
+                          settings.INFERENCE.get('max_wait', 0.0))
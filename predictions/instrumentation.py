@@ -0,0 +1,142 @@
+import resource
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+from logging import warning
+
+from django.conf import settings
+from django.utils.module_loading import import_string
+
+from mlswarm_api.metrics import registry
+
+TASK_BUCKETS = (1, 5, 15, 60, 300, 900, 1800, 3600, 4 * 3600, 12 * 3600)
+
+task_durations = registry.histogram(
+    'mlswarm_task_duration_seconds',
+    'Duration of the finished tasks.',
+    labels=('task', 'service', 'status'), buckets=TASK_BUCKETS)
+task_phases = registry.histogram(
+    'mlswarm_task_phase_duration_seconds',
+    'Duration of the phases of the finished tasks.',
+    labels=('task', 'service', 'phase'), buckets=TASK_BUCKETS)
+tasks = registry.gauge(
+    'mlswarm_tasks',
+    'Number of tasks, by status.',
+    labels=('task', 'status'))
+task_queue_wait = registry.histogram(
+    'mlswarm_task_queue_wait_seconds',
+    'Time tasks waited to be claimed by a worker, by priority.',
+    labels=('task', 'priority'), buckets=TASK_BUCKETS)
+task_cpu = registry.counter(
+    'mlswarm_task_cpu_seconds_total',
+    'CPU time spent by the finished tasks and their sub-processes.',
+    labels=('task', 'service'))
+
+
+class TaskHook:
+    """Receives the timings of tasks, e.g. to forward them to a tracing system.
+
+    Hooks are listed as dotted paths in the `TASK_HOOKS` setting.
+    """
+
+    def on_start(self, task):
+        pass
+
+    def on_phase(self, task, phase: dict):
+        pass
+
+    def on_finish(self, task, timings: dict):
+        pass
+
+
+@lru_cache()
+def hooks():
+    return tuple(import_string(path)() for path in getattr(settings, 'TASK_HOOKS', ()))
+
+
+def notify(event: str, *args):
+    for hook in hooks():
+        try:
+            getattr(hook, event)(*args)
+        except Exception as e:
+            warning('%s.%s failed: %s', type(hook).__name__, event, e)
+
+
+def _children_cpu():
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+
+def _reset_peak_rss():
+    # Linux resets the peak resident memory of a process on request, so it
+    # covers the current task only, not the ones the worker process ran before.
+    try:
+        with open('/proc/self/clear_refs', 'w') as f:
+            f.write('5')
+        return True
+    except OSError:
+        return False
+
+
+def _peak_rss():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmHWM:'):
+                return int(line.split()[1])
+
+
+class Timings:
+    """Wall and CPU time of each phase of a task, and its peak memory."""
+
+    def __init__(self, task):
+        self.task = task
+        self.phases = []
+        self.peak_rss_reset = _reset_peak_rss()
+        self.started = time.perf_counter(), time.process_time(), _children_cpu()
+
+    @contextmanager
+    def phase(self, name: str):
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield
+        finally:
+            phase = {'name': name,
+                     'wall_time': time.perf_counter() - wall,
+                     'cpu_time': time.process_time() - cpu}
+            self.phases.append(phase)
+            notify('on_phase', self.task, phase)
+
+    def as_dict(self):
+        wall, cpu, children_cpu = self.started
+        return {
+            'phases': self.phases,
+            'wall_time': time.perf_counter() - wall,
+            'cpu_time': time.process_time() - cpu,
+            # Folds and shards run by sub-processes.
+            'children_cpu_time': _children_cpu() - children_cpu,
+            # Peak resident memory of the process during the task, in KiB. Unknown
+            # where it cannot be reset, as it would include the previous tasks.
+            'peak_rss': _peak_rss() if self.peak_rss_reset else None,
+        }
+
+
+class MetricsHook(TaskHook):
+    """Feeds the durations of finished tasks to the metrics registry."""
+
+    def on_finish(self, task, timings: dict):
+        labels = dict(task=task._meta.model_name, service=task.estimator.service)
+
+        task_durations.observe(timings['wall_time'], status=task.status, **labels)
+        task_cpu.inc(timings['cpu_time'] + timings['children_cpu_time'], **labels)
+        for phase in timings['phases']:
+            task_phases.observe(phase['wall_time'], phase=phase['name'], **labels)
+
+
+def collect_tasks():
+    from django.db.models import Count
+    from .workers import TASK_MODELS
+
+    tasks.clear()
+    for model in TASK_MODELS:
+        for row in model.objects.values('status').annotate(count=Count('pk')).order_by():
+            tasks.set(row['count'], task=model._meta.model_name, status=row['status'])
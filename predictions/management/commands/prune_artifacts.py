@@ -0,0 +1,108 @@
+import json
+import os
+import shutil
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from predictions import artifacts
+from predictions.models import Task, Training
+
+UNFINISHED_STATUSES = (Task.Status.failed.value,
+                       Task.Status.cancelled.value,
+                       Task.Status.interrupted.value)
+
+
+class Command(BaseCommand):
+    help = ('Removes the artifacts of old trainings, the local copies of stored models '
+            'left unused, and the stored files no training refers to.')
+
+    def add_arguments(self, parser):
+        retention = settings.ARTIFACTS.get('retention', {})
+
+        parser.add_argument('--failed-days', type=int, default=retention.get('failed'),
+                            help='Remove the files of trainings which failed, were '
+                                 'cancelled or interrupted this many days ago.')
+        parser.add_argument('--completed-days', type=int, default=retention.get('completed'),
+                            help='Remove the models of trainings completed this many days '
+                                 'ago, unless reused by memoized trainings. Trainings of '
+                                 'the same fingerprint are then trained again.')
+        parser.add_argument('--local-days', type=int, default=retention.get('local'),
+                            help='Remove the local copies of stored models unused for this '
+                                 'many days. They are fetched again when needed.')
+        parser.add_argument('--dry-run', action='store_true',
+                            help='Only list what would be removed.')
+
+    def handle(self, *args, **options):
+        self.dry_run = options['dry_run']
+        now = timezone.now()
+
+        if options['failed_days'] is not None:
+            for t in (Training.objects
+                      .filter(status__in=UNFINISHED_STATUSES,
+                              finished_at__lt=now - timedelta(days=options['failed_days']))
+                      .iterator()):
+                self.remove(t, 'unfinished')
+
+        if options['completed_days'] is not None:
+            for t in (Training.objects
+                      .filter(status=Task.Status.completed.value,
+                              memoized_from__isnull=True,
+                              memoized__isnull=True,
+                              finished_at__lt=now - timedelta(days=options['completed_days']))
+                      .iterator()):
+                self.remove(t, 'expired')
+
+        if options['local_days'] is not None:
+            self.evict_local(time.time() - options['local_days'] * 24 * 3600)
+
+        self.collect_garbage()
+
+    def remove(self, training, reason):
+        # The training's own directory, even when memoized.
+        directory = os.path.dirname(training.checkpoints.directory)
+        if not training.raw_manifest and not os.path.exists(directory):
+            return
+
+        self.stdout.write('removing the files of %s training %s' % (reason, training.pk))
+        if self.dry_run:
+            return
+
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+        Training.objects.filter(pk=training.pk).update(raw_manifest='',
+                                                         updated_at=timezone.now())
+
+    def evict_local(self, unused_since):
+        stored = (Training.objects
+                  .filter(status=Task.Status.completed.value, memoized_from__isnull=True)
+                  .exclude(raw_manifest=''))
+
+        for t in stored.iterator():
+            if os.path.isdir(t.report_dir) and os.path.getmtime(t.report_dir) < unused_since:
+                self.stdout.write('removing the local copy of training %s' % t.pk)
+                if not self.dry_run:
+                    shutil.rmtree(t.report_dir)
+
+    def collect_garbage(self):
+        if Training.objects.filter(status=Task.Status.running.value).exists():
+            # Their files are stored before their manifests are.
+            self.stdout.write('trainings are running, stored files are kept')
+            return
+
+        referenced = set()
+        for manifest in (Training.objects
+                         .exclude(raw_manifest='')
+                         .values_list('raw_manifest', flat=True)
+                         .iterator()):
+            referenced.update(json.loads(manifest).values())
+
+        store = artifacts.store()
+        for digest in list(store.digests()):
+            if digest not in referenced:
+                self.stdout.write('removing stored file %s' % digest)
+                if not self.dry_run:
+                    store.delete(digest)
@@ -0,0 +1,33 @@
+from django.core.management.base import BaseCommand
+
+from predictions.workers import Worker
+
+
+class Command(BaseCommand):
+    help = 'Claims created trainings, tests and predictions and runs them.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--processes', type=int, default=None,
+                            help='Maximum number of tasks running at once.')
+        parser.add_argument('--cpus', type=float, default=None,
+                            help='Cpus shared by the tasks. Defaults to the machine\'s.')
+        parser.add_argument('--memory', type=int, default=None,
+                            help='Memory shared by the tasks, in MiB. Defaults to the '
+                                 'machine\'s.')
+        parser.add_argument('--poll-interval', type=float, default=None,
+                            help='Seconds between checks for new tasks.')
+        parser.add_argument('--name', default=None,
+                            help='The name identifying this worker on task leases.')
+        parser.add_argument('--metrics-port', type=int, default=None,
+                            help='Serve the metrics of the tasks on this port.')
+        parser.add_argument('--once', action='store_true',
+                            help='Dispatch the tasks currently available and exit '
+                                 'once they are finished.')
+
+    def handle(self, *args, **options):
+        Worker(processes=options['processes'],
+               poll_interval=options['poll_interval'],
+               name=options['name'],
+               metrics_port=options['metrics_port'],
+               cpus=options['cpus'],
+               memory=options['memory']).run(once=options['once'])
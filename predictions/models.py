@@ -1,22 +1,43 @@
+import gzip
+import hashlib
 import json
 import os
 import shutil
+from datetime import timedelta
 from logging import warning
 
+from django.conf import settings
 from django.contrib.auth.models import User
 from django.core.files.storage import FileSystemStorage
-from django.db.models import (TextField, ForeignKey, DateTimeField, CharField,
-                              DO_NOTHING, PROTECT, ManyToManyField)
+from django.db import IntegrityError, transaction
+from django.db.models import (Model, TextField, ForeignKey, DateTimeField, CharField,
+                              BooleanField, IntegerField, PositiveIntegerField, DO_NOTHING, PROTECT,
+                              SET_NULL, ManyToManyField)
 from django.utils import timezone
 
 from datasets.models import Chunk
+from datasets.streams import ChunkStream
 from mlswarm_api.models import (ChoiceEnum, IDatable, IDynamicProperties,
                                 IServiceTower)
-from . import services
+from . import artifacts, cancellation, instrumentation, services, sweeps
+from .checkpoints import Checkpoints
+from .sharding import predict_sharded
+from .validation import cross_validate, validation_summary
 
 training_fs = FileSystemStorage('trainings/')
 
 
+def summarize(report, depth=2):
+    """Keep the scalars of a report, replacing its sequences by their lengths."""
+    if isinstance(report, dict):
+        if depth == 0:
+            return {'keys': len(report)}
+        return {k: summarize(v, depth - 1) for k, v in report.items()}
+    if isinstance(report, (list, tuple)):
+        return {'length': len(report)}
+    return report
+
+
 class Estimator(IServiceTower,
                 IDatable):
     services = services.estimators
@@ -28,6 +49,94 @@ class Estimator(IServiceTower,
         return '%s #%i' % (self.service, self.id)
 
 
+class Lease(Model):
+    task_type = CharField(max_length=32, help_text='The model name of the leased task.')
+    task_id = PositiveIntegerField(help_text='The id of the leased task.')
+    owner = CharField(max_length=128, help_text='The worker currently running the task.')
+    acquired_at = DateTimeField(help_text='When the current owner acquired the lease.')
+    heartbeat_at = DateTimeField(help_text='The last time the owner reported to be alive.')
+    expires_at = DateTimeField(db_index=True,
+                               help_text='When the lease can be taken over by other workers.')
+
+    class Meta:
+        unique_together = ('task_type', 'task_id')
+
+    @classmethod
+    def acquire(cls, task, owner, ttl):
+        now = timezone.now()
+        key = dict(task_type=task._meta.model_name, task_id=task.pk)
+        fields = dict(owner=owner, acquired_at=now, heartbeat_at=now, expires_at=now + ttl)
+
+        # Take over the lease if its owner stopped reporting.
+        if cls.objects.filter(expires_at__lt=now, **key).update(**fields):
+            return True
+
+        try:
+            with transaction.atomic():
+                cls.objects.create(**key, **fields)
+        except IntegrityError:
+            return False
+        return True
+
+    @classmethod
+    def heartbeat(cls, owner, ttl):
+        """Renew the leases of `owner`, returning the tasks it still holds."""
+        now = timezone.now()
+        leases = cls.objects.filter(owner=owner)
+        leases.update(heartbeat_at=now, expires_at=now + ttl)
+        return set(leases.values_list('task_type', 'task_id'))
+
+    @classmethod
+    def release(cls, task_type, task_id, owner):
+        cls.objects.filter(task_type=task_type, task_id=task_id, owner=owner).delete()
+
+    @property
+    def expired(self):
+        return self.expires_at < timezone.now()
+
+    def __str__(self):
+        return '%s #%i: %s' % (self.task_type, self.task_id, self.owner)
+
+
+class StatusEvent(Model):
+    """A change of status of a task, streamed to the clients waiting on it."""
+
+    task_type = CharField(max_length=32, help_text='The model name of the task.')
+    task_id = PositiveIntegerField(help_text='The id of the task.')
+    estimator_id = PositiveIntegerField(db_index=True,
+                                        help_text='The id of the estimator used on the task.')
+    training_id = PositiveIntegerField(null=True, db_index=True,
+                                       help_text='The id of the training, if the task is or '
+                                                 'depends on one.')
+    status = CharField(max_length=12, help_text='The status the task moved to.')
+    created_at = DateTimeField(auto_now_add=True, db_index=True)
+
+    @classmethod
+    def record(cls, *tasks):
+        cls.objects.bulk_create([cls(task_type=t._meta.model_name,
+                                     task_id=t.pk,
+                                     estimator_id=t.estimator_id,
+                                     training_id=t.event_training_id,
+                                     status=t.status)
+                                 for t in tasks])
+
+    @classmethod
+    def since(cls, last_id: int, **filters):
+        return cls.objects.filter(pk__gt=last_id, **filters).order_by('pk')
+
+    @classmethod
+    def prune(cls, retention: timedelta):
+        cls.objects.filter(created_at__lt=timezone.now() - retention).delete()
+
+    def as_dict(self):
+        return {'id': self.pk, 'task_type': self.task_type, 'task_id': self.task_id,
+                'estimator': self.estimator_id, 'training': self.training_id,
+                'status': self.status, 'created_at': self.created_at.isoformat()}
+
+    def __str__(self):
+        return '%s #%i: %s' % (self.task_type, self.task_id, self.status)
+
+
 class Task(IDynamicProperties, IDatable):
     class Meta:
         abstract = True
@@ -38,6 +147,7 @@ class Task(IDynamicProperties, IDatable):
         interrupted = 'interrupted'
         failed = 'failed'
         completed = 'completed'
+        cancelled = 'cancelled'
 
     chunks = ManyToManyField(
         Chunk,
@@ -55,47 +165,210 @@ class Task(IDynamicProperties, IDatable):
     status = CharField(max_length=12, choices=Status.choices(),
                        default=Status.created.value,
                        help_text='The current status of this task.')
-
-    output = TextField(blank=True, help_text='The output of this task.')
+    priority = IntegerField(default=0, db_index=True,
+                            help_text='Tasks of higher priority are run first.')
+    cancel_requested = BooleanField(default=False,
+                                    help_text='Whether the worker running this task was '
+                                              'asked to stop it.')
+
+    raw_options = TextField(blank=True,
+                            help_text='The json-like options handled by the task itself, '
+                                      'stored as a string.')
+
+    raw_timings = TextField(blank=True,
+                            help_text='The json-like timings and resource usage of the '
+                                      'task\'s phases, stored as a string.')
+
+    output = TextField(blank=True, help_text='The output of this task, or its summary if '
+                                             'the output was stored in `output_file`.')
+    output_file = CharField(max_length=256, blank=True,
+                            help_text='The compressed file holding the output of this task, '
+                                      'when it is too large to be stored inline.')
     errors = TextField(blank=True, help_text='Eventual errors produced by this task.')
     started_at = DateTimeField(null=True, help_text='The starting time of the task.')
     finished_at = DateTimeField(null=True, help_text='The finishing time of the task.')
 
+    @property
+    def options(self):
+        return json.loads(self.raw_options) if self.raw_options else {}
+
+    @property
+    def timings(self):
+        return json.loads(self.raw_timings) if self.raw_timings else None
+
     @property
     def report(self):
         return json.loads(self.output) if self.output else None
 
+    @property
+    def output_path(self):
+        return os.path.join(training_fs.location, 'outputs',
+                            '%s-%i.json.gz' % (self._meta.model_name, self.pk))
+
+    def open_output(self):
+        """Open the complete output of this task, as a binary gzip stream."""
+        return open(os.path.join(training_fs.location, self.output_file), 'rb')
+
+    @property
+    def full_report(self):
+        if not self.output_file:
+            return self.report
+        with gzip.open(self.open_output(), 'rt') as f:
+            return json.load(f)
+
+    def save_output(self, report):
+        content = json.dumps(report)
+        self.discard_output()
+
+        if len(content) <= settings.TASK_OUTPUTS.get('inline_limit', 65536):
+            self.output = content
+            return
+
+        path = self.output_path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with gzip.open(path + '.tmp', 'wt') as f:
+            f.write(content)
+        os.replace(path + '.tmp', path)
+
+        self.output_file = os.path.relpath(path, training_fs.location)
+        self.output = json.dumps({'output_size': len(content),
+                                  'summary': summarize(report)})
+
+    def discard_output(self):
+        if self.output_file and training_fs.exists(self.output_file):
+            training_fs.delete(self.output_file)
+        self.output_file = ''
+
     @property
     def report_dir(self):
         return os.path.join(training_fs.location, str(self.id))
 
+    @property
+    def event_training_id(self):
+        return None
+
+    @property
+    def requirements(self):
+        """The cpus and memory (in MiB) reserved for this task by the workers."""
+        return self.process_requirements
+
+    @property
+    def process_requirements(self):
+        """The cpus and memory (in MiB) required by each process of this task."""
+        resources = settings.TASK_RESOURCES
+        requirements = dict(resources.get('default', {}),
+                            **resources.get(self.estimator.service, {}))
+        requirements.update({k: self.options[k] for k in ('cpus', 'memory')
+                             if k in self.options})
+        return requirements
+
+    def pool_size(self, parts: int):
+        """The number of processes running the `parts` of this task at once.
+
+        Unless set by the `processes` option, as many as fit in the cpus of a worker.
+        """
+        processes = self.options.get('processes')
+        if processes is None:
+            cpus = settings.TASK_WORKERS.get('cpus') or os.cpu_count()
+            processes = int(cpus // max(1, self.process_requirements.get('cpus', 1)))
+        return max(1, min(parts, processes))
+
+    def pool_requirements(self, parts: int):
+        # Each process loads its own copy of the estimator.
+        processes = self.pool_size(parts)
+        return {k: v * processes for k, v in self.process_requirements.items()}
+
+    def save(self, *args, **kwargs):
+        created = self.pk is None
+        super().save(*args, **kwargs)
+        if created:
+            StatusEvent.record(self)
+
+    def set_status(self, status: 'Task.Status'):
+        self.status = status.value
+        self.save()
+        StatusEvent.record(self)
+
+    def cancel(self):
+        """Cancel this task if queued, or ask the worker running it to stop it.
+
+        Returns whether the task was still queued or running.
+        """
+        tasks = type(self).objects.filter(pk=self.pk)
+
+        if tasks.filter(status=Task.Status.created.value).update(
+                status=Task.Status.cancelled.value,
+                finished_at=timezone.now(),
+                updated_at=timezone.now()):
+            self.refresh_from_db()
+            StatusEvent.record(self)
+            return True
+
+        if tasks.filter(status=Task.Status.running.value).update(
+                cancel_requested=True,
+                updated_at=timezone.now()):
+            self.refresh_from_db()
+            return True
+        return False
+
+    @property
+    def lease(self):
+        return (Lease.objects
+                .filter(task_type=self._meta.model_name, task_id=self.pk)
+                .first())
+
+    @property
+    def stream(self):
+        return ChunkStream(self.chunks.order_by('pk'))
+
     @property
     def merged_chunks(self):
-        d = [c.loaded for c in self.chunks.all()]
-        return d[0].concatenate(d)
+        return self.stream.merged()
+
+    def data_for(self, estimator, chunks=None):
+        stream = self.stream if chunks is None else ChunkStream(chunks.order_by('pk'))
+        return (stream
+                if getattr(estimator, 'accepts_streams', False)
+                else stream.merged())
+
+    def phase(self, name: str):
+        if getattr(self, '_timings', None) is None:
+            self._timings = instrumentation.Timings(self)
+        return self._timings.phase(name)
 
     def start(self):
-        self.status = Task.Status.running.value
         self.started_at = timezone.now()
-        self.save()
+        self.set_status(Task.Status.running)
+
+        self._timings = instrumentation.Timings(self)
+        instrumentation.notify('on_start', self)
 
         try:
-            self.setup()
-            self.run()
-            self.teardown()
+            with cancellation.cancellable(self.options.get('timeout')):
+                with self.phase('setup'):
+                    self.setup()
+                self.run()
+                with self.phase('teardown'):
+                    self.teardown()
         except KeyboardInterrupt:
-            self.status = Task.Status.interrupted.value
+            status = Task.Status.interrupted
+        except cancellation.TaskCancelled as e:
+            self.rollback()
+            status = Task.Status.cancelled
+            self.errors = str(e)
         except Exception as e:
             warning(e)
 
             self.rollback()
-            self.status = Task.Status.failed.value
+            status = Task.Status.failed
             self.errors = str(e)
         else:
-            self.status = Task.Status.completed.value
+            status = Task.Status.completed
         finally:
             self.finished_at = timezone.now()
-            self.save()
+            self.raw_timings = json.dumps(self._timings.as_dict())
+            self.set_status(status)
+            instrumentation.notify('on_finish', self, self.timings)
 
     def run(self):
         raise NotImplementedError
@@ -109,6 +382,11 @@ class Task(IDynamicProperties, IDatable):
     def rollback(self):
         pass
 
+    def discard(self):
+        """Remove everything this task left on the disk."""
+        self.rollback()
+        self.discard_output()
+
     def __str__(self):
         return '%s #%i: %s' % (self.__class__.__name__,
                                self.pk,
@@ -116,21 +394,312 @@ class Task(IDynamicProperties, IDatable):
 
 
 class Training(Task):
+    fingerprint = CharField(max_length=64, blank=True, db_index=True,
+                            help_text='The digest of the estimator, chunks and properties '
+                                      'used on this training.')
+    memoized_from = ForeignKey('self', null=True, blank=True,
+                               on_delete=PROTECT,
+                               related_name='memoized',
+                               help_text='The identical training whose results were reused.')
+    sweep = ForeignKey('Sweep', null=True, blank=True,
+                       on_delete=SET_NULL,
+                       related_name='trainings',
+                       help_text='The hyperparameter sweep which created this training.')
+    parent = ForeignKey('self', null=True, blank=True,
+                        on_delete=PROTECT,
+                        related_name='children',
+                        help_text='The completed training whose model is updated with the '
+                                  'chunks of this one.')
+    raw_manifest = TextField(blank=True,
+                             help_text='The digest of each file saved by this training, '
+                                       'kept in the artifact store.')
+
+    @property
+    def report_dir(self):
+        if self.memoized_from_id:
+            return self.memoized_from.report_dir
+        return super().report_dir
+
+    @property
+    def manifest(self):
+        return json.loads(self.raw_manifest) if self.raw_manifest else None
+
+    @property
+    def stored(self):
+        """Whether the model of this training is still kept."""
+        if self.memoized_from_id:
+            return self.memoized_from.stored
+        return bool(self.raw_manifest) or os.path.isdir(self.report_dir)
+
+    def ensure_local(self):
+        """The local directory of this training's model, fetched from the artifact store."""
+        if self.memoized_from_id:
+            return self.memoized_from.ensure_local()
+
+        if self.manifest:
+            artifacts.store().pull(self.manifest, self.report_dir)
+        elif not os.path.isdir(self.report_dir):
+            raise ValueError('The model of training %s is no longer stored.' % self.pk)
+
+        # Local copies unused for long are removed by `prune_artifacts`.
+        os.utime(self.report_dir)
+        return self.report_dir
+
+    def compute_fingerprint(self):
+        h = hashlib.sha256()
+        for v in (self.estimator.service, self.estimator.raw_properties,
+                  self.parent.fingerprint if self.parent_id else '',
+                  *sorted(c.digest for c in self.chunks.all()),
+                  json.dumps(self.properties, sort_keys=True)):
+            h.update(str(v).encode())
+            h.update(b'\0')
+        return h.hexdigest()
+
+    def find_memoized(self):
+        previous = (Training.objects
+                    .filter(fingerprint=self.fingerprint,
+                            status=Task.Status.completed.value)
+                    .exclude(pk=self.pk)
+                    .select_related('memoized_from')
+                    .order_by('finished_at'))
+
+        # Trainings whose model was removed by `prune_artifacts` are skipped.
+        for training in previous.iterator():
+            training = training.memoized_from or training
+            if training.stored:
+                return training
+        return None
+
+    @property
+    def event_training_id(self):
+        return self.pk
+
+    @property
+    def checkpoints(self):
+        # Kept under the training's own directory, even when memoized.
+        return Checkpoints(os.path.join(training_fs.location, str(self.pk), 'checkpoints'),
+                           interval=self.options.get('checkpoint_interval', 600),
+                           keep=self.options.get('keep_checkpoints', 2))
+
+    @property
+    def lineage(self):
+        """The ids of the trainings this one was warm-started from, closest first."""
+        ids, training = [], self
+        while training.parent_id:
+            ids.append(training.parent_id)
+            training = training.parent
+        return ids
+
+    @property
+    def resumable(self):
+        return self.status in (Task.Status.interrupted.value, Task.Status.failed.value)
+
+    def resume(self):
+        self.errors = ''
+        self.finished_at = None
+        self.cancel_requested = False
+        self.set_status(Task.Status.created)
+
+    def start(self):
+        super().start()
+
+        if self.sweep_id:
+            self.sweep.prune()
+
     def run(self):
-        estimator = self.estimator.loaded
-        report = estimator.train(self.merged_chunks,
-                                 report_dir=self.report_dir,
-                                 **self.properties)
-        estimator.save(self.report_dir)
+        if self.memoized_from_id:
+            self.save_output(self.memoized_from.full_report)
+            return
+
+        with self.phase('build_estimator'):
+            estimator = self.estimator.loaded
+            checkpoints = getattr(estimator, 'accepts_checkpoints', False)
+            latest = self.checkpoints.latest() if checkpoints else None
+
+            if latest is not None:
+                estimator = estimator.load(latest.path)
+            elif self.parent_id:
+                # Warm-start from the model of the parent training.
+                estimator = estimator.load(self.parent.ensure_local())
+
+            options = ({'checkpoint': self.checkpoints.saver(estimator),
+                        'initial_step': latest.step if latest else 0}
+                       if checkpoints else {})
+        with self.phase('load_chunks'):
+            data = self.data_for(estimator)
+        with self.phase('run'):
+            report = estimator.train(data, report_dir=self.report_dir,
+                                     **options, **self.properties)
+        with self.phase('save'):
+            estimator.save(self.report_dir)
+            self.raw_manifest = json.dumps(artifacts.store().push(
+                self.report_dir, exclude=(self.checkpoints.directory,)))
         estimator.dispose()
-        self.output = json.dumps(report)
+        self.checkpoints.discard()
+        self.save_output(report)
 
     def setup(self):
-        os.makedirs(self.report_dir, exist_ok=True)
+        self.fingerprint = self.compute_fingerprint()
+
+        if self.options.get('memoize', True):
+            self.memoized_from = self.find_memoized()
+
+        if not self.memoized_from_id:
+            os.makedirs(self.report_dir, exist_ok=True)
 
     def rollback(self):
-        if os.path.exists(self.report_dir):
-            shutil.rmtree(self.report_dir)
+        self.raw_manifest = ''
+
+        if self.memoized_from_id:
+            # The report directory belongs to the memoized training.
+            self.memoized_from = None
+        elif os.path.exists(self.report_dir):
+            # Checkpoints are kept, so the training can be resumed.
+            for name in os.listdir(self.report_dir):
+                path = os.path.join(self.report_dir, name)
+                if path == self.checkpoints.directory:
+                    continue
+                if os.path.isdir(path):
+                    shutil.rmtree(path)
+                else:
+                    os.remove(path)
+
+    def discard(self):
+        super().discard()
+        self.checkpoints.discard()
+
+        # The training's own directory, even when memoized.
+        directory = os.path.dirname(self.checkpoints.directory)
+        if os.path.exists(directory):
+            shutil.rmtree(directory)
+
+
+class Sweep(IDynamicProperties, IDatable):
+    class Strategy(ChoiceEnum):
+        grid = 'grid'
+        random = 'random'
+
+    class Mode(ChoiceEnum):
+        max = 'max'
+        min = 'min'
+
+    estimator = ForeignKey(
+        Estimator,
+        on_delete=DO_NOTHING,
+        related_name='sweeps',
+        help_text='The estimator being tuned.')
+    owner = ForeignKey(User, on_delete=PROTECT, help_text='The user who requested the sweep.')
+    chunks = ManyToManyField(
+        Chunk,
+        related_name='sweeps',
+        help_text='The chunks used on the trainings of this sweep.')
+
+    strategy = CharField(max_length=8, choices=Strategy.choices(),
+                         default=Strategy.grid.value,
+                         help_text='How configurations are drawn from the search space.')
+    raw_space = TextField(help_text='The json-like search space over the training properties, '
+                                    'stored as a string.')
+    samples = PositiveIntegerField(null=True, blank=True,
+                                   help_text='The number of configurations drawn by random sweeps.')
+    seed = IntegerField(null=True, blank=True,
+                        help_text='The seed of random sweeps.')
+
+    metric = CharField(max_length=128,
+                       help_text='The dotted path of the score within the trainings\' reports.')
+    mode = CharField(max_length=3, choices=Mode.choices(), default=Mode.max.value,
+                     help_text='Whether the metric should be maximized or minimized.')
+    patience = PositiveIntegerField(null=True, blank=True,
+                                    help_text='Cancel the pending trainings after this many '
+                                              'completed trainings without improvement.')
+
+    @property
+    def space(self):
+        return json.loads(self.raw_space) if self.raw_space else None
+
+    @property
+    def configurations(self):
+        return sweeps.expand(self.space, self.strategy, self.samples, self.seed)
+
+    @property
+    def status(self):
+        statuses = {t.status for t in self.trainings.all()}
+
+        for status in (Task.Status.running, Task.Status.created):
+            if status.value in statuses:
+                return Task.Status.running.value
+        if statuses and statuses <= {Task.Status.cancelled.value}:
+            return Task.Status.cancelled.value
+        return Task.Status.completed.value
+
+    def score(self, training):
+        return sweeps.lookup(training.full_report, self.metric)
+
+    def is_better(self, score, best):
+        if best is None:
+            return True
+        return score > best if self.mode == Sweep.Mode.max.value else score < best
+
+    @property
+    def leaderboard(self):
+        scored = []
+        for t in self.trainings.filter(status=Task.Status.completed.value):
+            score = self.score(t)
+            if score is not None:
+                scored.append({'training': t.pk, 'score': score, 'properties': t.properties})
+
+        return sorted(scored, key=lambda e: e['score'],
+                      reverse=self.mode == Sweep.Mode.max.value)
+
+    def spawn(self, configurations):
+        chunks = list(self.chunks.all())
+
+        for raw_properties, raw_options in configurations:
+            training = Training.objects.create(estimator_id=self.estimator_id,
+                                               owner_id=self.owner_id,
+                                               sweep=self,
+                                               raw_properties=raw_properties,
+                                               raw_options=raw_options)
+            training.chunks.set(chunks)
+
+    def cancel(self, running: bool = True):
+        pending = list(self.trainings.filter(status=Task.Status.created.value))
+        (self.trainings
+         .filter(pk__in=[t.pk for t in pending], status=Task.Status.created.value)
+         .update(status=Task.Status.cancelled.value,
+                 finished_at=timezone.now(),
+                 updated_at=timezone.now()))
+
+        for t in pending:
+            t.status = Task.Status.cancelled.value
+        StatusEvent.record(*pending)
+
+        if running:
+            # Running trainings are stopped by their workers.
+            (self.trainings
+             .filter(status=Task.Status.running.value)
+             .update(cancel_requested=True, updated_at=timezone.now()))
+
+    def prune(self):
+        """Cancel the pending trainings once the best score stopped improving."""
+        if not self.patience:
+            return
+
+        best, stale = None, 0
+        for t in (self.trainings
+                  .filter(status=Task.Status.completed.value)
+                  .order_by('finished_at')):
+            score = self.score(t)
+            if score is not None and self.is_better(score, best):
+                best, stale = score, 0
+            else:
+                stale += 1
+
+        if stale >= self.patience:
+            # Running trainings may still improve on the best score.
+            self.cancel(running=False)
+
+    def __str__(self):
+        return 'Sweep #%i: %s' % (self.pk, self.estimator)
 
 
 class PostTrainingTask(Task):
@@ -141,22 +710,133 @@ class PostTrainingTask(Task):
                           on_delete=PROTECT,
                           help_text='Estimator\'s training that will be evaluated.')
 
+    @property
+    def event_training_id(self):
+        return self.training_id
+
 
 class Test(PostTrainingTask):
     def run(self):
-        estimator = self.estimator.loaded
-        report = (estimator
-                  .load(self.training.report_dir)
-                  .test(self.merged_chunks, report_dir=self.report_dir, **self.properties))
+        with self.phase('build_estimator'):
+            estimator = self.estimator.loaded.load(self.training.ensure_local())
+        with self.phase('load_chunks'):
+            data = self.data_for(estimator)
+        with self.phase('run'):
+            report = estimator.test(data, report_dir=self.report_dir, **self.properties)
         estimator.dispose()
-        self.output = json.dumps(report)
+        self.save_output(report)
 
 
 class Predict(PostTrainingTask):
+    @property
+    def requirements(self):
+        if not self.options.get('sharded'):
+            return super().requirements
+        return self.pool_requirements(self.chunks.count())
+
+    @property
+    def shards_dir(self):
+        return os.path.join(training_fs.location, 'outputs', 'predict-%i' % self.pk)
+
+    @property
+    def shards(self):
+        report = self.full_report
+        return report.get('shards') if isinstance(report, dict) else None
+
     def run(self):
-        estimator = self.estimator.loaded
-        report = (estimator
-                  .load(self.training.report_dir)
-                  .predict(self.merged_chunks, report_dir=self.report_dir, **self.properties))
+        if self.options.get('sharded'):
+            with self.phase('run'):
+                shards = predict_sharded(self, self.pool_size(self.chunks.count()))
+            self.save_output({'shards': shards,
+                              'rows': sum(s['rows'] or 0 for s in shards)})
+            return
+
+        with self.phase('build_estimator'):
+            estimator = self.estimator.loaded.load(self.training.ensure_local())
+        with self.phase('load_chunks'):
+            data = self.data_for(estimator)
+        with self.phase('run'):
+            report = estimator.predict(data, report_dir=self.report_dir, **self.properties)
         estimator.dispose()
-        self.output = json.dumps(report)
+        self.save_output(report)
+
+    def predict_chunk(self, pk: int):
+        estimator = self.estimator.loaded.load(self.training.ensure_local())
+        stream = ChunkStream(Chunk.objects.filter(pk=pk))
+        os.makedirs(self.shards_dir, exist_ok=True)
+        shards = []
+
+        try:
+            for index, part in enumerate(stream.batches(self.options.get('shard_rows'))):
+                report = estimator.predict(part, report_dir=self.report_dir, **self.properties)
+                path = os.path.join(self.shards_dir, '%i-%04i.json.gz' % (pk, index))
+
+                with gzip.open(path + '.tmp', 'wt') as f:
+                    json.dump(report, f)
+                os.replace(path + '.tmp', path)
+
+                shards.append({'chunk': pk, 'index': index,
+                               'rows': len(part) if hasattr(part, '__len__') else None,
+                               'file': os.path.relpath(path, training_fs.location)})
+        finally:
+            estimator.dispose()
+
+        return shards
+
+    def rollback(self):
+        if os.path.exists(self.shards_dir):
+            shutil.rmtree(self.shards_dir)
+
+
+class CrossValidation(Task):
+    """Trains and tests the estimator over k folds of the chunks, concurrently."""
+
+    @property
+    def report_dir(self):
+        return os.path.join(training_fs.location, 'cross-validations', str(self.id))
+
+    @property
+    def requirements(self):
+        return self.pool_requirements(self.options.get('folds') or self.chunks.count())
+
+    @property
+    def folds(self):
+        chunks = list(self.chunks.order_by('pk').values_list('pk', flat=True))
+        k = self.options.get('folds') or len(chunks)
+
+        if not 2 <= k <= len(chunks):
+            raise ValueError('%i folds cannot be drawn from %i chunks.' % (k, len(chunks)))
+        return [chunks[i::k] for i in range(k)]
+
+    def run(self):
+        with self.phase('run'):
+            reports = cross_validate(self, self.pool_size(len(self.folds)))
+        self.save_output({'folds': reports,
+                          'summary': validation_summary(reports)})
+
+    def run_fold(self, fold: int):
+        folds = self.folds
+        train = [c for i, f in enumerate(folds) if i != fold for c in f]
+        report_dir = os.path.join(self.report_dir, 'fold-%i' % fold)
+        os.makedirs(report_dir, exist_ok=True)
+
+        estimator = self.estimator.build()
+        try:
+            train_report = estimator.train(
+                self.data_for(estimator, Chunk.objects.filter(pk__in=train)),
+                report_dir=report_dir, **self.properties)
+            test_report = estimator.test(
+                self.data_for(estimator, Chunk.objects.filter(pk__in=folds[fold])),
+                report_dir=report_dir, **self.options.get('test_properties', {}))
+        finally:
+            estimator.dispose()
+
+        return {'fold': fold, 'chunks': folds[fold],
+                'train': train_report, 'test': test_report}
+
+    def setup(self):
+        os.makedirs(self.report_dir, exist_ok=True)
+
+    def rollback(self):
+        if os.path.exists(self.report_dir):
+            shutil.rmtree(self.report_dir)
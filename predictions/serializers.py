@@ -1,17 +1,84 @@
-from typing import ClassVar
+import json
+from typing import ClassVar, TYPE_CHECKING
 
+from django.conf import settings
+
+from django.db import transaction
 from rest_framework import serializers
 from rest_framework.serializers import Serializer
 
-from mlswarm.infrastructure.services.estimators.serializers import ITrain, ITest, IPredict
+from datasets import stats
 from mlswarm_api.serializers import PropertiesSerializerMixin
-from . import models, services
+from . import models, services, sweeps
+
+if TYPE_CHECKING:
+    from mlswarm.infrastructure.services.estimators.serializers import ITrain, ITest, IPredict
+
+
+# Fields left out of listings, where they would dominate the payload.
+DETAIL_FIELDS = ['report', 'errors', 'timings', 'lineage', 'manifest']
+
+
+class TaskOptionsSerializer(serializers.Serializer):
+    cpus = serializers.FloatField(
+        required=False, min_value=0,
+        help_text='The cpus reserved for the task, or for each of its processes when its '
+                  'parts run in parallel. Defaults to the service\'s requirements.')
+    memory = serializers.IntegerField(
+        required=False, min_value=0,
+        help_text='The memory reserved for the task, or for each of its processes, in MiB. '
+                  'Defaults to the service\'s requirements.')
+    timeout = serializers.FloatField(
+        required=False, min_value=0,
+        help_text='The seconds after which the running task is cancelled.')
+
+
+class TrainingOptionsSerializer(TaskOptionsSerializer):
+    memoize = serializers.BooleanField(
+        default=True,
+        help_text='Whether the results of an identical completed training can be reused.')
+    checkpoint_interval = serializers.FloatField(
+        default=600, min_value=0,
+        help_text='The minimum number of seconds between checkpoints, for estimators '
+                  'which support them.')
+    keep_checkpoints = serializers.IntegerField(
+        default=2, min_value=1,
+        help_text='The number of latest checkpoints kept.')
+
+
+class PredictOptionsSerializer(TaskOptionsSerializer):
+    sharded = serializers.BooleanField(
+        default=False,
+        help_text='Whether the chunks are predicted in parallel processes, each shard '
+                  'written to its own file.')
+    shard_rows = serializers.IntegerField(
+        required=False, min_value=1,
+        help_text='The number of rows in each shard. Defaults to one shard per chunk.')
+    processes = serializers.IntegerField(
+        required=False, min_value=1,
+        help_text='The number of chunks predicted at once.')
+
+
+class CrossValidationOptionsSerializer(TaskOptionsSerializer):
+    folds = serializers.IntegerField(
+        required=False, min_value=2,
+        help_text='The number of folds. Defaults to one fold per chunk.')
+    processes = serializers.IntegerField(
+        required=False, min_value=1,
+        help_text='The number of folds evaluated at once.')
+    test_properties = serializers.DictField(
+        required=False, default=dict,
+        help_text='The json-like properties used when testing each fold.')
 
 
 class TaskSerializer(PropertiesSerializerMixin,
                      serializers.ModelSerializer):
     properties = serializers.JSONField(
         help_text='The json-like properties for task.')
+    options = serializers.JSONField(
+        read_only=True,
+        help_text='The options handled by the task itself, given among its properties.')
+    options_serializer_class = TaskOptionsSerializer
     owner = serializers.PrimaryKeyRelatedField(
         read_only=True)
     estimator = serializers.PrimaryKeyRelatedField(
@@ -21,21 +88,58 @@ class TaskSerializer(PropertiesSerializerMixin,
         read_only=False,
         many=True,
         queryset=models.Chunk.objects.all())
+    priority = serializers.IntegerField(
+        default=0, min_value=-10, max_value=10,
+        help_text='Tasks of higher priority are run first. Only staff members can '
+                  'raise the priority of tasks above 0.')
 
     class Meta:
         model = models.Task
-        fields = ['id', 'chunks', 'status', 'errors', 'report', 'owner', 'estimator',
-                  'properties', 'started_at', 'finished_at', 'created_at', 'updated_at']
-        read_only_fields = ['status', 'report', 'owner', 'estimator', 'errors',
-                            'started_at', 'finished_at', 'created_at', 'updated_at']
+        fields = ['id', 'chunks', 'status', 'priority', 'cancel_requested', 'errors', 'report',
+                  'owner', 'estimator', 'properties', 'options', 'timings', 'started_at',
+                  'finished_at', 'created_at', 'updated_at']
+        read_only_fields = ['status', 'cancel_requested', 'report', 'owner', 'estimator',
+                            'errors', 'options', 'timings', 'started_at', 'finished_at',
+                            'created_at', 'updated_at']
+
+    def validate_priority(self, value):
+        request = self.context.get('request')
+        if value > 0 and (request is None or not request.user.is_staff):
+            raise serializers.ValidationError('Only staff members can raise the priority '
+                                              'of tasks.')
+        return value
 
     def validate_chunks(self, value):
         if not value:
             raise serializers.ValidationError('At least one chunk must be '
                                               'selected in order to perform '
                                               'this task.')
+
+        schemas = [(c.pk, c.schema) for c in value if c.raw_schema]
+        for pk, schema in schemas[1:]:
+            if not stats.compatible(schemas[0][1], schema):
+                raise serializers.ValidationError(
+                    'The columns of chunk %s (%s) are incompatible with the ones of '
+                    'chunk %s (%s).' % (pk, ', '.join(schema),
+                                        schemas[0][0], ', '.join(schemas[0][1])))
         return value
 
+    def split_options(self, properties):
+        if not isinstance(properties, dict):
+            return properties, {}
+
+        properties = dict(properties)
+        options = {k: properties.pop(k)
+                   for k in self.options_serializer_class().fields
+                   if k in properties}
+
+        serializer = self.options_serializer_class(data=options)
+        if not serializer.is_valid():
+            raise serializers.ValidationError({
+                'properties': serializer.errors
+            })
+        return properties, serializer.validated_data
+
     def service_serializer_cls(self, data: dict) -> ClassVar[Serializer]:
         q = self.context['view'].get_parents_query_dict()
         e = models.Estimator.objects.get(pk=q['estimator'])
@@ -44,17 +148,50 @@ class TaskSerializer(PropertiesSerializerMixin,
 
 
 class TrainingSerializer(TaskSerializer):
-    def service_serializer_cls(self, data: dict) -> ClassVar[ITrain]:
+    options_serializer_class = TrainingOptionsSerializer
+    parent = serializers.PrimaryKeyRelatedField(
+        required=False, allow_null=True,
+        queryset=models.Training.objects.all(),
+        help_text='A completed training of the same estimator, whose model is updated '
+                  'with the chunks of this one.')
+    manifest = serializers.JSONField(
+        read_only=True,
+        help_text='The digest of each file saved by the training, in the artifact store.')
+    lineage = serializers.ListField(
+        read_only=True,
+        help_text='The ids of the trainings this one was warm-started from, closest first.')
+
+    def service_serializer_cls(self, data: dict) -> ClassVar['ITrain']:
         return super().service_serializer_cls(data).Train
 
+    def validate_parent(self, value):
+        if value is None:
+            return value
+
+        q = self.context['view'].get_parents_query_dict()
+        if str(value.estimator_id) != str(q['estimator']):
+            raise serializers.ValidationError('Only trainings of the same estimator can be '
+                                              'warm-started from.')
+        if value.status != models.Task.Status.completed.value:
+            raise serializers.ValidationError('Training %s is %s, but only completed '
+                                              'trainings can be warm-started from.'
+                                              % (value.pk, value.status))
+        return value
+
     class Meta:
         model = models.Training
-        fields = TaskSerializer.Meta.fields
-        read_only_fields = TaskSerializer.Meta.read_only_fields
+        fields = TaskSerializer.Meta.fields + ['memoized_from', 'parent', 'lineage', 'manifest']
+        read_only_fields = TaskSerializer.Meta.read_only_fields + ['memoized_from', 'lineage',
+                                                                   'manifest']
+
+
+class TrainingSummarySerializer(TrainingSerializer):
+    class Meta(TrainingSerializer.Meta):
+        fields = [f for f in TrainingSerializer.Meta.fields if f not in DETAIL_FIELDS]
 
 
 class TestSerializer(TaskSerializer):
-    def service_serializer_cls(self, data: dict) -> ClassVar[ITest]:
+    def service_serializer_cls(self, data: dict) -> ClassVar['ITest']:
         return super().service_serializer_cls(data).Predict
 
     class Meta:
@@ -63,8 +200,15 @@ class TestSerializer(TaskSerializer):
         read_only_fields = TaskSerializer.Meta.read_only_fields
 
 
+class TestSummarySerializer(TestSerializer):
+    class Meta(TestSerializer.Meta):
+        fields = [f for f in TestSerializer.Meta.fields if f not in DETAIL_FIELDS]
+
+
 class PredictSerializer(TaskSerializer):
-    def service_serializer_cls(self, data: dict) -> ClassVar[IPredict]:
+    options_serializer_class = PredictOptionsSerializer
+
+    def service_serializer_cls(self, data: dict) -> ClassVar['IPredict']:
         return super().service_serializer_cls(data).Predict
 
     class Meta:
@@ -73,6 +217,152 @@ class PredictSerializer(TaskSerializer):
         read_only_fields = TaskSerializer.Meta.read_only_fields
 
 
+class PredictSummarySerializer(PredictSerializer):
+    class Meta(PredictSerializer.Meta):
+        fields = [f for f in PredictSerializer.Meta.fields if f not in DETAIL_FIELDS]
+
+
+class SweepSerializer(serializers.ModelSerializer):
+    space = serializers.JSONField(
+        help_text='The values of each training property. Grid sweeps take lists of values, '
+                  'random sweeps also take {min, max, scale, type} ranges.')
+    properties = serializers.JSONField(
+        required=False, default=dict,
+        help_text='The json-like training properties shared by all configurations.')
+    owner = serializers.PrimaryKeyRelatedField(read_only=True)
+    estimator = serializers.PrimaryKeyRelatedField(read_only=True)
+    chunks = serializers.PrimaryKeyRelatedField(
+        read_only=False,
+        many=True,
+        queryset=models.Chunk.objects.all())
+    trainings = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+
+    class Meta:
+        model = models.Sweep
+        fields = ['id', 'chunks', 'strategy', 'space', 'samples', 'seed', 'properties',
+                  'metric', 'mode', 'patience', 'status', 'leaderboard', 'trainings',
+                  'owner', 'estimator', 'created_at', 'updated_at']
+        read_only_fields = ['status', 'leaderboard', 'trainings', 'owner', 'estimator',
+                            'created_at', 'updated_at']
+
+    validate_chunks = TaskSerializer.validate_chunks
+
+    def validate(self, data):
+        strategy = data.get('strategy', models.Sweep.Strategy.grid.value)
+        errors = sweeps.validate_space(data['space'], strategy)
+        if errors:
+            raise serializers.ValidationError({'space': errors})
+
+        if strategy == models.Sweep.Strategy.random.value and not data.get('samples'):
+            raise serializers.ValidationError({
+                'samples': ['Random sweeps must draw at least one configuration.']
+            })
+
+        count = sweeps.size(data['space'], strategy, data.get('samples'))
+        limit = settings.SWEEPS.get('max_trainings', 1000)
+        if count > limit:
+            raise serializers.ValidationError({
+                'space': ['The sweep would create %i trainings, more than the limit of %i.'
+                          % (count, limit)]
+            })
+
+        configurations = sweeps.expand(data['space'], strategy,
+                                       data.get('samples'), data.get('seed'))
+
+        # Each configuration is validated as the properties of a training.
+        trainings = TrainingSerializer(context=self.context)
+        serializer_cls = trainings.service_serializer_cls(data)
+        self.configurations = []
+
+        for configuration in configurations:
+            properties, options = trainings.split_options(dict(data['properties'],
+                                                               **configuration))
+            serializer = serializer_cls(data=properties)
+            if not serializer.is_valid():
+                raise serializers.ValidationError({
+                    'space': {json.dumps(configuration): serializer.errors}
+                })
+            self.configurations.append((json.dumps(serializer.validated_data),
+                                        json.dumps(options)))
+
+        data['raw_space'] = json.dumps(data.pop('space'))
+        data['raw_properties'] = json.dumps(data.pop('properties'))
+        return data
+
+    def create(self, validated_data):
+        with transaction.atomic():
+            sweep = super().create(validated_data)
+            sweep.spawn(self.configurations)
+        return sweep
+
+
+class SweepSummarySerializer(SweepSerializer):
+    class Meta(SweepSerializer.Meta):
+        fields = [f for f in SweepSerializer.Meta.fields if f != 'leaderboard']
+
+
+class OnlinePredictionSerializer(serializers.Serializer):
+    data = serializers.ListField(
+        child=serializers.ListField(),
+        allow_empty=False,
+        help_text='The feature rows to predict.')
+    properties = serializers.JSONField(
+        required=False, default=dict,
+        help_text='The json-like prediction properties of the estimator\'s service.')
+
+    def validate_data(self, value):
+        if any(len(row) != len(value[0]) for row in value):
+            raise serializers.ValidationError('All rows must have the same number of values.')
+        return value
+
+    def validate_properties(self, value):
+        training = self.context['training']
+        serializer_cls = training.estimator.services.get(training.estimator.service).Predict
+        serializer = serializer_cls(data=value)
+
+        if not serializer.is_valid():
+            raise serializers.ValidationError(serializer.errors)
+        return serializer.validated_data
+
+
+class CrossValidationSerializer(TaskSerializer):
+    options_serializer_class = CrossValidationOptionsSerializer
+
+    def service_serializer_cls(self, data: dict) -> ClassVar['ITrain']:
+        return super().service_serializer_cls(data).Train
+
+    def validate(self, data):
+        data = super().validate(data)
+        options = json.loads(data['raw_options'])
+
+        if len(data['chunks']) < options.get('folds', 2):
+            raise serializers.ValidationError({
+                'chunks': ['At least %i chunks are needed, one for each fold.'
+                           % options.get('folds', 2)]
+            })
+
+        test_serializer = TaskSerializer.service_serializer_cls(self, data).Predict(
+            data=options['test_properties'])
+        if not test_serializer.is_valid():
+            raise serializers.ValidationError({
+                'properties': {'test_properties': test_serializer.errors}
+            })
+        options['test_properties'] = test_serializer.validated_data
+        data['raw_options'] = json.dumps(options)
+
+        return data
+
+    class Meta:
+        model = models.CrossValidation
+        fields = TaskSerializer.Meta.fields
+        read_only_fields = TaskSerializer.Meta.read_only_fields
+
+
+class CrossValidationSummarySerializer(CrossValidationSerializer):
+    class Meta(CrossValidationSerializer.Meta):
+        fields = [f for f in CrossValidationSerializer.Meta.fields if f not in DETAIL_FIELDS]
+
+
 class EstimatorSerializer(PropertiesSerializerMixin,
                           serializers.ModelSerializer):
     properties = serializers.JSONField(help_text='The json-like properties '
@@ -86,7 +376,7 @@ class EstimatorSerializer(PropertiesSerializerMixin,
 
 
 class EstimatorDetailSerializer(EstimatorSerializer):
-    trainings = TrainingSerializer(many=True, read_only=True)
+    trainings = TrainingSummarySerializer(many=True, read_only=True)
 
     class Meta(EstimatorSerializer.Meta):
         fields = EstimatorSerializer.Meta.fields + ['trainings']
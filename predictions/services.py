@@ -1,7 +1,8 @@
-from mlswarm.infrastructure.services import ServiceBuilder
-from mlswarm.infrastructure.services.estimators.serializers import (SimpleDenseNetworkClassifier, DummyRegressor)
+from mlswarm_api.services import LazyServiceBuilder
 
-estimators = ServiceBuilder({
-    'dummy-regressor': DummyRegressor,
-    'simple-dense-network-classifier': SimpleDenseNetworkClassifier,
+estimators = LazyServiceBuilder({
+    'dummy-regressor':
+        'mlswarm.infrastructure.services.estimators.serializers.DummyRegressor',
+    'simple-dense-network-classifier':
+        'mlswarm.infrastructure.services.estimators.serializers.SimpleDenseNetworkClassifier',
 })
@@ -0,0 +1,28 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+
+import django
+
+
+def run_shards(pk: int, chunk: int):
+    from .models import Predict
+    return Predict.objects.get(pk=pk).predict_chunk(chunk)
+
+
+def predict_sharded(task, processes: int = None):
+    """Predict the chunks of a `Predict` task in separate processes.
+
+    Each process loads its own copy of the model and writes the predictions
+    of every shard to a file as soon as it is done, so only one shard of
+    predictions is held in memory at a time.
+    """
+    chunks = list(task.chunks.order_by('pk').values_list('pk', flat=True))
+    processes = min(len(chunks), processes or os.cpu_count())
+
+    with ProcessPoolExecutor(max_workers=processes,
+                             mp_context=get_context('spawn'),
+                             initializer=django.setup) as pool:
+        return [shard
+                for shards in pool.map(run_shards, [task.pk] * len(chunks), chunks)
+                for shard in shards]
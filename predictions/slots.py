@@ -0,0 +1,39 @@
+import os
+
+import django
+from django.db import close_old_connections
+
+from mlswarm_api.metrics import observe_cache, registry
+
+
+def run_task(model_name: str, pk: int):
+    from django.apps import apps
+
+    close_old_connections()
+    task = apps.get_model('predictions', model_name).objects.get(pk=pk)
+    task.start()
+
+
+def serve(tasks, done):
+    """Entry point of the processes spawned by a `Worker`.
+
+    Runs the tasks sent through the `tasks` queue until `None` is received,
+    reporting each finished task and the metrics it produced on `done`.
+    Serving many tasks from the same process lets them share the
+    process-wide caches, such as the chunk cache.
+
+    Spawned processes import this module before Django is set up, so the
+    models are only imported once it is.
+    """
+    # The process and the ones it starts can be killed together.
+    os.setpgrp()
+    django.setup()
+
+    from datasets.models import chunk_cache
+
+    for model_name, pk in iter(tasks.get, None):
+        try:
+            run_task(model_name, pk)
+        finally:
+            observe_cache(chunk_cache, 'chunks')
+            done.put((model_name, pk, registry.drain()))
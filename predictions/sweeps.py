@@ -0,0 +1,82 @@
+import functools
+import itertools
+import math
+import operator
+import random
+
+
+def validate_space(space: dict, strategy: str):
+    """Check a search space, returning a list of errors."""
+    if not isinstance(space, dict) or not space:
+        return ['The search space must be a non-empty object.']
+
+    errors = []
+    for name, values in space.items():
+        if isinstance(values, list):
+            if not values:
+                errors.append('%s: at least one value must be given.' % name)
+        elif isinstance(values, dict) and strategy == 'random':
+            if not {'min', 'max'} <= set(values):
+                errors.append('%s: ranges must have a min and a max.' % name)
+            elif not all(isinstance(values[k], (int, float)) and not isinstance(values[k], bool)
+                         for k in ('min', 'max')):
+                errors.append('%s: the min and max of ranges must be numbers.' % name)
+            elif values['min'] > values['max']:
+                errors.append('%s: the min of ranges cannot exceed their max.' % name)
+            elif values.get('scale') == 'log' and values['min'] <= 0:
+                errors.append('%s: log ranges must be positive.' % name)
+        else:
+            errors.append('%s: must be a list of values%s.'
+                          % (name, ' or a {min, max} range' if strategy == 'random' else ''))
+    return errors
+
+
+def grid(space: dict):
+    names = sorted(space)
+    for values in itertools.product(*(space[n] for n in names)):
+        yield dict(zip(names, values))
+
+
+def draw(values, rng: random.Random):
+    if isinstance(values, list):
+        return rng.choice(values)
+
+    low, high = values['min'], values['max']
+    if values.get('scale') == 'log':
+        value = math.exp(rng.uniform(math.log(low), math.log(high)))
+    else:
+        value = rng.uniform(low, high)
+
+    return int(round(value)) if values.get('type') == 'int' else value
+
+
+def sample(space: dict, samples: int, seed=None):
+    rng = random.Random(seed)
+    names = sorted(space)
+    for _ in range(samples):
+        yield {n: draw(space[n], rng) for n in names}
+
+
+def size(space: dict, strategy: str, samples: int = None):
+    """The number of configurations `expand` returns, without building them."""
+    if strategy == 'grid':
+        return functools.reduce(operator.mul, (len(v) for v in space.values()), 1)
+    return samples or 0
+
+
+def expand(space: dict, strategy: str, samples: int = None, seed=None):
+    if strategy == 'grid':
+        return list(grid(space))
+    return list(sample(space, samples, seed))
+
+
+def lookup(report, path: str):
+    """Find the value at the dotted `path` of a report, or `None`."""
+    for key in path.split('.'):
+        if isinstance(report, dict):
+            report = report.get(key)
+        elif isinstance(report, list) and key.lstrip('-').isdigit():
+            report = report[int(key)] if -len(report) <= int(key) < len(report) else None
+        else:
+            return None
+    return report if isinstance(report, (int, float)) else None
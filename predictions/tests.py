@@ -1,3 +1,632 @@
-from django.test import TestCase
+import json
+import os
+import shutil
+import tempfile
+import threading
+from datetime import timedelta
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.test import SimpleTestCase, TestCase
+from django.utils import timezone
+from rest_framework.exceptions import ValidationError
+from rest_framework.test import APITestCase
+
+from datasets.models import Chunk, Dataset
+from . import sweeps
+from .artifacts import LocalArtifactStore, S3ArtifactStore
+from .batching import MicroBatcher, split
+from .checkpoints import Checkpoints
+from .inference import LoadedModel, ModelCache
+from .models import (CrossValidation, Estimator, Lease, Predict, StatusEvent, Sweep, Task,
+                     Test, Training, training_fs)
+from .serializers import OnlinePredictionSerializer
+from .workers import Job, Worker
+
+
+class SweepsTest(SimpleTestCase):
+    def test_validate_space(self):
+        self.assertEqual(sweeps.validate_space({'a': [1, 2]}, 'grid'), [])
+        self.assertEqual(sweeps.validate_space({'a': {'min': 0.1, 'max': 1, 'scale': 'log'}},
+                                               'random'), [])
+
+        self.assertEqual(len(sweeps.validate_space({}, 'grid')), 1)
+        self.assertEqual(len(sweeps.validate_space({'a': []}, 'grid')), 1)
+        self.assertEqual(len(sweeps.validate_space({'a': {'min': 0, 'max': 1}}, 'grid')), 1)
+        self.assertEqual(len(sweeps.validate_space({'a': {'min': 0}}, 'random')), 1)
+        self.assertEqual(len(sweeps.validate_space({'a': {'min': '0', 'max': 1}}, 'random')), 1)
+        self.assertEqual(len(sweeps.validate_space({'a': {'min': 2, 'max': 1}}, 'random')), 1)
+        self.assertEqual(len(sweeps.validate_space({'a': {'min': 0, 'max': 1, 'scale': 'log'}},
+                                                   'random')), 1)
+
+    def test_expand_grid(self):
+        space = {'b': [1, 2, 3], 'a': ['x', 'y']}
+        configurations = sweeps.expand(space, 'grid')
+
+        self.assertEqual(len(configurations), sweeps.size(space, 'grid'))
+        self.assertEqual(configurations[:2], [{'a': 'x', 'b': 1}, {'a': 'x', 'b': 2}])
+        self.assertEqual(len({tuple(sorted(c.items())) for c in configurations}), 6)
+
+    def test_expand_random(self):
+        space = {'a': {'min': 1, 'max': 100, 'type': 'int'},
+                 'b': {'min': 0.001, 'max': 1, 'scale': 'log'},
+                 'c': ['x', 'y']}
+        configurations = sweeps.expand(space, 'random', samples=20, seed=42)
+
+        self.assertEqual(len(configurations), sweeps.size(space, 'random', 20))
+        self.assertEqual(configurations, sweeps.expand(space, 'random', samples=20, seed=42))
+        for c in configurations:
+            self.assertIsInstance(c['a'], int)
+            self.assertTrue(1 <= c['a'] <= 100)
+            self.assertTrue(0.001 <= c['b'] <= 1)
+            self.assertIn(c['c'], ('x', 'y'))
+
+    def test_size_does_not_build_the_grid(self):
+        space = {str(i): list(range(10)) for i in range(12)}
+        self.assertEqual(sweeps.size(space, 'grid'), 10 ** 12)
+
+    def test_lookup(self):
+        report = {'validation': {'accuracy': 0.9, 'history': [0.5, 0.7, 0.8]},
+                  'name': 'model'}
+
+        self.assertEqual(sweeps.lookup(report, 'validation.accuracy'), 0.9)
+        self.assertEqual(sweeps.lookup(report, 'validation.history.-1'), 0.8)
+        self.assertIsNone(sweeps.lookup(report, 'validation.history.3'))
+        self.assertIsNone(sweeps.lookup(report, 'validation.loss'))
+        self.assertIsNone(sweeps.lookup(report, 'name'))
+        self.assertIsNone(sweeps.lookup(None, 'validation'))
+
+
+class BatchingTest(SimpleTestCase):
+    def test_split_sequences(self):
+        self.assertEqual(split([1, 2, 3, 4, 5], [0, 2, 5]), [[1, 2], [3, 4, 5]])
+
+    def test_split_dicts(self):
+        self.assertEqual(split({'labels': [1, 2, 3], 'scores': [.1, .2, .3]}, [0, 1, 3]),
+                         [{'labels': [1], 'scores': [.1]},
+                          {'labels': [2, 3], 'scores': [.2, .3]}])
+
+    def test_results_not_per_row_are_not_split(self):
+        self.assertIsNone(split([1, 2], [0, 2, 3]))
+        self.assertIsNone(split({'labels': [1, 2, 3], 'loss': 0.1}, [0, 1, 3]))
+        self.assertIsNone(split('abc', [0, 1, 3]))
+
+    def test_stopped_batcher_predicts_on_its_own(self):
+        batcher = MicroBatcher(lambda data: [x * 2 for x in data],
+                               max_batch_size=10, max_wait=0)
+        batcher.stop()
+        batcher._thread.join(1)
+
+        self.assertFalse(batcher._thread.is_alive())
+        self.assertEqual(batcher.predict([1, 2], timeout=1), [2, 4])
+
+
+    def predict_concurrently(self, batcher, *requests):
+        results = [None] * len(requests)
+
+        def predict(i):
+            try:
+                results[i] = batcher.predict(requests[i], timeout=5)
+            except ValueError as e:
+                results[i] = e
+
+        threads = [threading.Thread(target=predict, args=(i,)) for i in range(len(requests))]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return results
+
+    def test_requests_of_different_widths_are_predicted_individually(self):
+        batches = []
+
+        def predict(data):
+            batches.append(len(data))
+            return [sum(row) for row in data]
+
+        batcher = MicroBatcher(predict, max_batch_size=10, max_wait=0.5)
+        self.addCleanup(batcher.stop)
+        results = self.predict_concurrently(batcher, [[1, 2]], [[1, 2, 3], [4, 5, 6]])
+
+        self.assertEqual(results, [[3], [6, 15]])
+        self.assertEqual(sorted(batches), [1, 2])
+
+    def test_errors_only_fail_their_request(self):
+        def predict(data):
+            if any(v < 0 for row in data for v in row):
+                raise ValueError('negative values')
+            return [sum(row) for row in data]
+
+        batcher = MicroBatcher(predict, max_batch_size=10, max_wait=0.5)
+        self.addCleanup(batcher.stop)
+        results = self.predict_concurrently(batcher, [[1, 2]], [[-1, 2]], [[3, 4]])
+
+        self.assertEqual(results[0], [3])
+        self.assertIsInstance(results[1], ValueError)
+        self.assertEqual(results[2], [7])
+
+    def test_rows_of_online_predictions_have_the_same_width(self):
+        serializer = OnlinePredictionSerializer()
+        self.assertEqual(serializer.validate_data([[1, 2], [3, 4]]), [[1, 2], [3, 4]])
+        with self.assertRaises(ValidationError):
+            serializer.validate_data([[1, 2], [3]])
+
+
+class FakePredictor:
+    def __init__(self):
+        self.disposed = False
+
+    def predict(self, data, report_dir=None):
+        if self.disposed:
+            raise RuntimeError('the estimator was disposed')
+        return [sum(row) for row in data]
+
+    def dispose(self):
+        self.disposed = True
+
+
+class ModelCacheTest(SimpleTestCase):
+    def setUp(self):
+        self.cache = ModelCache(max_models=1)
+        self.training = SimpleNamespace(pk=1, finished_at=None)
+        patcher = mock.patch.object(ModelCache, 'load',
+                                    lambda cache, training: LoadedModel(FakePredictor()))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_evicted_models_are_disposed(self):
+        model = self.cache.get(self.training)
+        self.cache.get(SimpleNamespace(pk=2, finished_at=None))
+
+        self.assertTrue(model.disposed)
+        self.assertTrue(model.estimator.disposed)
+
+    def test_models_disposed_after_being_fetched_are_loaded_again(self):
+        stale = self.cache.get(self.training)
+        self.cache.evict(self.training)
+
+        # The model was fetched right before it was evicted.
+        get, fetched = self.cache.get, [stale]
+        self.cache.get = lambda training: fetched.pop() if fetched else get(training)
+
+        self.assertEqual(self.cache.predict(self.training, [[1, 2]]), [3])
+        self.assertIsNot(get(self.training), stale)
+
+
+class FakeEstimator:
+    def __init__(self):
+        self.saved = 0
+
+    def save(self, path):
+        self.saved += 1
+        with open(os.path.join(path, 'model'), 'w') as f:
+            f.write(str(self.saved))
+
+
+class CheckpointsTest(SimpleTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+
+    def test_keeps_the_latest_checkpoints(self):
+        checkpoints = Checkpoints(os.path.join(self.directory, 'checkpoints'), keep=2)
+        self.assertEqual(checkpoints.all(), [])
+        self.assertIsNone(checkpoints.latest())
+
+        estimator = FakeEstimator()
+        for step in (1, 2, 10):
+            checkpoints.save(estimator, step)
+
+        self.assertEqual([c.step for c in checkpoints.all()], [2, 10])
+        latest = checkpoints.latest()
+        self.assertEqual(latest.step, 10)
+        with open(os.path.join(latest.path, 'model')) as f:
+            self.assertEqual(f.read(), '3')
+
+    def test_ignores_incomplete_checkpoints(self):
+        checkpoints = Checkpoints(self.directory)
+        os.makedirs(os.path.join(self.directory, 'step-00000005.tmp'))
+        self.assertEqual(checkpoints.all(), [])
+
+    def test_saver_waits_for_the_interval(self):
+        checkpoints = Checkpoints(self.directory, interval=3600)
+        checkpoint = checkpoints.saver(FakeEstimator())
+
+        checkpoint(1)
+        self.assertEqual(checkpoints.all(), [])
+        checkpoint(2, force=True)
+        self.assertEqual([c.step for c in checkpoints.all()], [2])
+
+    def test_discard(self):
+        checkpoints = Checkpoints(os.path.join(self.directory, 'checkpoints'))
+        checkpoints.save(FakeEstimator(), 1)
+        checkpoints.discard()
+
+        self.assertFalse(os.path.exists(checkpoints.directory))
+        checkpoints.discard()
+
+
+class ArtifactStoreTestMixin:
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.store = self.build_store()
+
+    def write(self, name, content):
+        path = os.path.join(self.directory, 'model', name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def test_push_and_pull(self):
+        self.write('weights', 'abc')
+        self.write('config/options.json', '{}')
+        manifest = self.store.push(os.path.join(self.directory, 'model'))
+
+        self.assertEqual(set(manifest), {'weights', os.path.join('config', 'options.json')})
+        self.assertTrue(all(self.store.exists(digest) for digest in manifest.values()))
+
+        target = os.path.join(self.directory, 'copy')
+        self.store.pull(manifest, target)
+        with open(os.path.join(target, 'weights')) as f:
+            self.assertEqual(f.read(), 'abc')
+        self.assertEqual(os.listdir(os.path.join(target, 'config')), ['options.json'])
+
+    def test_push_excludes_directories(self):
+        self.write('weights', 'abc')
+        self.write('checkpoints/step-00000001/weights', 'ab')
+        model = os.path.join(self.directory, 'model')
+        manifest = self.store.push(model, exclude=(os.path.join(model, 'checkpoints'),))
+
+        self.assertEqual(list(manifest), ['weights'])
+
+    def test_identical_files_are_stored_once(self):
+        self.write('a', 'same')
+        self.write('b', 'same')
+        manifest = self.store.push(os.path.join(self.directory, 'model'))
+
+        self.assertEqual(manifest['a'], manifest['b'])
+        self.assertEqual(list(self.store.digests()), [manifest['a']])
+
+    def test_delete(self):
+        self.write('a', 'content')
+        digest = self.store.put(os.path.join(self.directory, 'model', 'a'))
+        self.store.delete(digest)
+
+        self.assertFalse(self.store.exists(digest))
+        self.assertEqual(list(self.store.digests()), [])
+
+
+class LocalArtifactStoreTest(ArtifactStoreTestMixin, SimpleTestCase):
+    def build_store(self):
+        return LocalArtifactStore(os.path.join(self.directory, 'artifacts'))
+
+
+class S3ArtifactStoreTest(ArtifactStoreTestMixin, SimpleTestCase):
+    def build_store(self):
+        return S3ArtifactStore('bucket', client='predictions.artifacts.InMemoryS3Client')
+
+    def test_lists_every_page(self):
+        self.store.client.objects.update({('bucket', 'artifacts/%04i' % i): b''
+                                          for i in range(1500)})
+        self.store.client.objects['other', 'artifacts/0000'] = b''
+
+        self.assertEqual(len(list(self.store.digests())), 1500)
+
+
+class FixturesMixin:
+    def setUp(self):
+        super().setUp()
+        self.user = User.objects.create_superuser('admin', 'admin@example.com', 'admin')
+        self.dataset = Dataset.objects.create(name='iris')
+        self.chunk = Chunk.objects.create(dataset=self.dataset, service='csv',
+                                          raw_properties=json.dumps({'path': 'iris.csv'}))
+        self.estimator = Estimator.objects.create(service='dummy-regressor',
+                                                  raw_properties='{}')
+        self.training = self.create(Training, status=Task.Status.completed.value)
+
+    def create(self, model, **fields):
+        fields.setdefault('estimator', self.estimator)
+        if model is not Sweep:
+            fields.setdefault('raw_properties', '{}')
+        fields.setdefault('owner', self.user)
+        task = model.objects.create(**fields)
+        task.chunks.set([self.chunk])
+        return task
+
+
+class ConditionalRetrieveTest(FixturesMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def test_detail_routes(self):
+        training = '/estimators/%i/trainings/%i/' % (self.estimator.pk, self.training.pk)
+        urls = ['/estimators/%i/' % self.estimator.pk,
+                training,
+                training + 'tests/%i/' % self.create(Test, training=self.training).pk,
+                training + 'predictions/%i/' % self.create(Predict, training=self.training).pk,
+                '/estimators/%i/cross-validations/%i/' % (
+                    self.estimator.pk, self.create(CrossValidation).pk),
+                '/estimators/%i/sweeps/%i/' % (self.estimator.pk, self.create(
+                    Sweep, raw_space=json.dumps({'a': [1]}), metric='score').pk)]
+
+        for url in urls:
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                self.assertIn('Last-Modified', response)
+
+                response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(response.status_code, 304)
+
+    def test_instance_without_relations(self):
+        estimator = Estimator.objects.create(service='dummy-regressor', raw_properties='{}')
+        response = self.client.get('/estimators/%i/' % estimator.pk)
+        self.assertEqual(response.status_code, 200)
+
+    def test_changes_of_the_instance_are_noticed(self):
+        url = '/estimators/%i/' % self.estimator.pk
+        response = self.client.get(url)
+
+        Estimator.objects.filter(pk=self.estimator.pk).update(
+            updated_at=timezone.now() + timedelta(hours=1))
+        response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified'])
+        self.assertEqual(response.status_code, 200)
+
+    def test_missing_instance(self):
+        response = self.client.get('/estimators/%i/' % (self.estimator.pk + 1))
+        self.assertEqual(response.status_code, 404)
+
+
+class DeleteTaskTest(FixturesMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        patcher = mock.patch.object(training_fs, 'location', self.directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_delete_prediction_discards_its_shards(self):
+        predict = self.create(Predict, training=self.training,
+                              status=Task.Status.completed.value)
+        os.makedirs(predict.shards_dir)
+
+        response = self.client.delete('/estimators/%i/trainings/%i/predictions/%i/'
+                                      % (self.estimator.pk, self.training.pk, predict.pk))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Predict.objects.filter(pk=predict.pk).exists())
+        self.assertFalse(os.path.exists(predict.shards_dir))
+
+    def test_running_tasks_are_not_deleted(self):
+        predict = self.create(Predict, training=self.training,
+                              status=Task.Status.running.value)
+
+        response = self.client.delete('/estimators/%i/trainings/%i/predictions/%i/'
+                                      % (self.estimator.pk, self.training.pk, predict.pk))
+        self.assertEqual(response.status_code, 400)
+        self.assertTrue(Predict.objects.filter(pk=predict.pk).exists())
+
+    def test_delete_training_discards_its_model_and_checkpoints(self):
+        training = self.create(Training, status=Task.Status.failed.value)
+        checkpoints = training.checkpoints
+        checkpoints.save(FakeEstimator(), 1)
+        FakeEstimator().save(training.report_dir)
+
+        response = self.client.delete('/estimators/%i/trainings/%i/'
+                                      % (self.estimator.pk, training.pk))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(os.path.exists(training.report_dir))
+
+    def test_delete_memoized_training_keeps_the_model(self):
+        os.makedirs(self.training.report_dir)
+        FakeEstimator().save(self.training.report_dir)
+        training = self.create(Training, status=Task.Status.completed.value,
+                               memoized_from=self.training)
+
+        response = self.client.delete('/estimators/%i/trainings/%i/'
+                                      % (self.estimator.pk, training.pk))
+        self.assertEqual(response.status_code, 204)
+        self.assertTrue(os.path.exists(os.path.join(self.training.report_dir, 'model')))
+
+
+class LeaseTest(FixturesMixin, TestCase):
+    ttl = timedelta(minutes=1)
+
+    def setUp(self):
+        super().setUp()
+        self.task = self.create(Training)
+
+    def test_leases_have_one_owner(self):
+        self.assertTrue(Lease.acquire(self.task, 'a', self.ttl))
+        self.assertFalse(Lease.acquire(self.task, 'b', self.ttl))
+        self.assertEqual(self.task.lease.owner, 'a')
+
+    def test_expired_leases_are_taken_over(self):
+        Lease.acquire(self.task, 'a', self.ttl)
+        Lease.objects.update(expires_at=timezone.now() - self.ttl)
+
+        self.assertTrue(Lease.acquire(self.task, 'b', self.ttl))
+        self.assertEqual(self.task.lease.owner, 'b')
+        self.assertEqual(Lease.heartbeat('a', self.ttl), set())
+        self.assertEqual(Lease.heartbeat('b', self.ttl), {('training', self.task.pk)})
+
+    def test_heartbeat_renews_the_leases(self):
+        Lease.acquire(self.task, 'a', self.ttl)
+        Lease.objects.update(expires_at=timezone.now() - self.ttl)
+        Lease.heartbeat('a', self.ttl)
+
+        self.assertFalse(self.task.lease.expired)
+
+    def test_only_the_owner_releases_a_lease(self):
+        Lease.acquire(self.task, 'a', self.ttl)
+
+        Lease.release('training', self.task.pk, 'b')
+        self.assertIsNotNone(self.task.lease)
+        Lease.release('training', self.task.pk, 'a')
+        self.assertIsNone(self.task.lease)
+
+    def test_worker_kills_tasks_whose_lease_was_lost(self):
+        worker = Worker(processes=1, name='a', cpus=1, memory=1024)
+        slot = mock.Mock(job=Job('training', self.task.pk, 'dummy-regressor', self.user.pk,
+                                 0, 0, None),
+                         lost=False)
+        worker.slots.append(slot)
+
+        Lease.acquire(self.task, 'a', self.ttl)
+        worker.heartbeat()
+        self.assertFalse(slot.lost)
+
+        Lease.objects.update(owner='b')
+        worker.heartbeat()
+        self.assertTrue(slot.lost)
+        slot.kill.assert_called_once_with()
+
+
+class WorkerTest(FixturesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.worker = Worker(processes=2, name='a', cpus=1, memory=1024)
+
+    def test_candidates_are_the_created_tasks(self):
+        created = self.create(Training)
+        self.create(Test, training=self.training, status=Task.Status.running.value)
+
+        self.assertEqual(self.worker.candidates(), [created])
+
+    def test_candidates_are_limited_per_owner(self):
+        for _ in range(3):
+            self.create(Training)
+        other = User.objects.create_user('other')
+        task = self.create(Training, owner=other)
+
+        candidates = self.worker.candidates()
+        self.assertEqual(len(candidates), 3)
+        self.assertIn(task, candidates)
+
+    def test_tasks_of_expired_leases_are_candidates(self):
+        task = self.create(Training, status=Task.Status.running.value)
+        Lease.acquire(task, 'b', -timedelta(minutes=1))
+
+        self.assertEqual(self.worker.candidates(), [task])
+
+    def test_claim_runs_the_task(self):
+        task = self.create(Training)
+
+        self.assertTrue(self.worker.claim(task))
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.Status.running.value)
+        self.assertIsNotNone(task.started_at)
+        self.assertEqual(task.lease.owner, 'a')
+
+    def test_tasks_are_claimed_once(self):
+        task = self.create(Training)
+        self.assertTrue(Worker(name='b').claim(task))
+
+        self.assertFalse(self.worker.claim(task))
+        self.assertEqual(task.lease.owner, 'b')
+
+    def test_finished_tasks_are_not_claimed(self):
+        self.assertFalse(self.worker.claim(self.training))
+        self.assertIsNone(self.training.lease)
+
+
+class MemoizeTest(FixturesMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        patcher = mock.patch.object(training_fs, 'location', self.directory)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        self.task = self.create(Training)
+        self.task.fingerprint = self.task.compute_fingerprint()
+
+    def previous(self, **fields):
+        fields.setdefault('status', Task.Status.completed.value)
+        return self.create(Training, fingerprint=self.task.fingerprint,
+                           finished_at=timezone.now(), **fields)
+
+    def test_identical_trainings_are_fingerprinted_alike(self):
+        other = self.create(Training)
+        self.assertEqual(other.compute_fingerprint(), self.task.fingerprint)
+
+        other = self.create(Training, raw_properties=json.dumps({'strategy': 'median'}))
+        self.assertNotEqual(other.compute_fingerprint(), self.task.fingerprint)
+
+    def test_finds_completed_trainings_whose_model_is_stored(self):
+        self.previous(status=Task.Status.failed.value, raw_manifest='{}')
+        self.create(Training, fingerprint='other', status=Task.Status.completed.value,
+                    raw_manifest='{}')
+        stored = self.previous(raw_manifest=json.dumps({'model': 'digest'}))
+
+        self.assertEqual(self.task.find_memoized(), stored)
+
+    def test_finds_models_stored_locally(self):
+        stored = self.previous()
+        os.makedirs(stored.report_dir)
+
+        self.assertEqual(self.task.find_memoized(), stored)
+
+    def test_follows_memoized_trainings(self):
+        stored = self.previous(raw_manifest=json.dumps({'model': 'digest'}))
+        self.previous(memoized_from=stored)
+        Training.objects.filter(pk=stored.pk).update(fingerprint='other')
+
+        self.assertEqual(self.task.find_memoized(), stored)
+
+    def test_skips_pruned_trainings(self):
+        self.previous()
+        self.assertIsNone(self.task.find_memoized())
+
+        stored = self.previous(raw_manifest=json.dumps({'model': 'digest'}))
+        self.assertEqual(self.task.find_memoized(), stored)
+
+
+class CancelTest(FixturesMixin, APITestCase):
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+
+    def url(self, task):
+        return '/estimators/%i/trainings/%i/cancel/' % (self.estimator.pk, task.pk)
+
+    def test_created_tasks_are_cancelled(self):
+        task = self.create(Training)
+
+        response = self.client.post(self.url(task))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data['status'], Task.Status.cancelled.value)
+        task.refresh_from_db()
+        self.assertEqual(task.status, Task.Status.cancelled.value)
+        self.assertIsNotNone(task.finished_at)
+        self.assertTrue(StatusEvent.objects.filter(task_type='training', task_id=task.pk,
+                                                   status=task.status).exists())
+
+    def test_running_tasks_are_asked_to_stop(self):
+        task = self.create(Training, status=Task.Status.running.value)
+
+        self.assertTrue(task.cancel())
+        self.assertEqual(task.status, Task.Status.running.value)
+        self.assertTrue(task.cancel_requested)
+
+    def test_finished_tasks_are_not_cancelled(self):
+        response = self.client.post(self.url(self.training))
+        self.assertEqual(response.status_code, 400)
+        self.training.refresh_from_db()
+        self.assertEqual(self.training.status, Task.Status.completed.value)
+
+    def test_cancelling_a_sweep_cancels_its_pending_trainings(self):
+        sweep = self.create(Sweep, raw_space=json.dumps({'a': [1]}), metric='score')
+        pending = self.create(Training, sweep=sweep)
+        running = self.create(Training, sweep=sweep, status=Task.Status.running.value)
+
+        sweep.cancel()
+        pending.refresh_from_db()
+        running.refresh_from_db()
+        self.assertEqual(pending.status, Task.Status.cancelled.value)
+        self.assertTrue(running.cancel_requested)
@@ -0,0 +1,49 @@
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from statistics import mean, pstdev
+
+import django
+
+
+def flatten(report, prefix=''):
+    """Map the dotted paths of a report to its numeric values."""
+    if isinstance(report, dict):
+        items = report.items()
+    elif isinstance(report, list):
+        items = enumerate(report)
+    else:
+        return ({prefix.rstrip('.'): report}
+                if isinstance(report, (int, float)) and not isinstance(report, bool)
+                else {})
+
+    values = {}
+    for key, value in items:
+        values.update(flatten(value, '%s%s.' % (prefix, key)))
+    return values
+
+
+def validation_summary(reports):
+    """Mean and standard deviation of the test metrics found in all folds."""
+    metrics = [flatten(r['test']) for r in reports]
+    common = set.intersection(*(set(m) for m in metrics)) if metrics else set()
+
+    return {path: {'mean': mean(m[path] for m in metrics),
+                   'std': pstdev(m[path] for m in metrics)}
+            for path in sorted(common)}
+
+
+def run_fold(pk: int, fold: int):
+    from .models import CrossValidation
+    return CrossValidation.objects.get(pk=pk).run_fold(fold)
+
+
+def cross_validate(task, processes: int = None):
+    """Run the folds of a `CrossValidation` task in separate processes."""
+    k = len(task.folds)
+    processes = min(k, processes or os.cpu_count())
+
+    with ProcessPoolExecutor(max_workers=processes,
+                             mp_context=get_context('spawn'),
+                             initializer=django.setup) as pool:
+        return list(pool.map(run_fold, [task.pk] * k, range(k)))
@@ -1,48 +1,390 @@
-from rest_framework import viewsets
+import json
+import threading
+import time
+import zlib
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import transaction
+from django.http import FileResponse, StreamingHttpResponse
+from rest_framework import status, viewsets
+from rest_framework.decorators import detail_route
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
 from rest_framework_extensions.mixins import NestedViewSetMixin, DetailSerializerMixin
 
-from .models import Estimator, Training, Test, Predict
+from django.db.models import Prefetch
+
+from mlswarm_api.views import ConditionalRetrieveMixin, FieldsMixin
+from .inference import models_cache
+from .models import (Estimator, Task, Training, Test, Predict, Sweep, CrossValidation,
+                     StatusEvent, training_fs)
 from .serializers import (EstimatorSerializer, EstimatorDetailSerializer,
-                          TaskSerializer, TrainingSerializer,
-                          TestSerializer, PredictSerializer)
+                          TaskSerializer, TrainingSerializer, TrainingSummarySerializer,
+                          TestSerializer, TestSummarySerializer,
+                          PredictSerializer, PredictSummarySerializer,
+                          CrossValidationSerializer, CrossValidationSummarySerializer,
+                          SweepSerializer, SweepSummarySerializer,
+                          OnlinePredictionSerializer)
+
+# Columns not needed by the summary serializers.
+DETAIL_COLUMNS = ('output', 'errors', 'raw_timings')
+
+FINISHED_STATUSES = (Task.Status.completed.value,
+                     Task.Status.failed.value,
+                     Task.Status.cancelled.value)
+
+
+# Each stream holds a thread of the API process for as long as it lasts.
+event_streams = threading.BoundedSemaphore(settings.STATUS_EVENTS.get('max_streams', 8))
+
+
+class LimitedStream:
+    """Iterates over `stream`, releasing its place in `semaphore` once closed.
+
+    Responses are closed even when their content was never iterated, unlike
+    generators, whose `finally` blocks only run once started.
+    """
+
+    def __init__(self, stream, semaphore):
+        self.stream = stream
+        self.semaphore = semaphore
+        self.closed = False
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return next(self.stream)
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.stream.close()
+            self.semaphore.release()
+
+
+def event_stream(last_id: int, **filters):
+    """Yield the status events after `last_id` as server-sent events.
 
+    The stream ends after `stream_duration` seconds, and clients reconnect
+    with the id of the last event received in the `Last-Event-ID` header.
+    """
+    options = settings.STATUS_EVENTS
+    deadline = time.monotonic() + options['stream_duration']
+    idle = 0
 
-class EstimatorViewSet(DetailSerializerMixin,
+    yield 'retry: %i\n\n' % (options['poll_interval'] * 1000)
+
+    while time.monotonic() < deadline:
+        events = list(StatusEvent.since(last_id, **filters)[:100])
+
+        for e in events:
+            last_id = e.pk
+            yield 'id: %i\nevent: status\ndata: %s\n\n' % (e.pk, json.dumps(e.as_dict()))
+
+        if events:
+            idle = 0
+            continue
+
+        # Comments keep proxies from closing idle connections.
+        idle += options['poll_interval']
+        if idle >= options['heartbeat']:
+            idle = 0
+            yield ': heartbeat\n\n'
+        time.sleep(options['poll_interval'])
+
+
+class StatusEventsMixin:
+    event_field = None
+
+    @detail_route(methods=['get'])
+    def events(self, request, *args, **kwargs):
+        obj = self.get_object()
+        last_id = request.META.get('HTTP_LAST_EVENT_ID', request.query_params.get('since'))
+
+        if last_id is None:
+            latest = StatusEvent.objects.order_by('-pk').first()
+            last_id = latest.pk if latest else 0
+        try:
+            last_id = int(last_id)
+        except ValueError:
+            raise ValidationError({'since': ['The id of an event is expected.']})
+
+        if not event_streams.acquire(blocking=False):
+            response = Response({'detail': 'Too many event streams are open, wait for '
+                                           'status changes with the status route instead.'},
+                                status=status.HTTP_503_SERVICE_UNAVAILABLE)
+            response['Retry-After'] = int(settings.STATUS_EVENTS['stream_duration'])
+            return response
+
+        stream = event_stream(last_id, **{self.event_field: obj.pk})
+        response = StreamingHttpResponse(LimitedStream(stream, event_streams),
+                                         content_type='text/event-stream')
+        response['Cache-Control'] = 'no-cache'
+        response['X-Accel-Buffering'] = 'no'
+        return response
+
+
+class EstimatorViewSet(StatusEventsMixin,
+                       ConditionalRetrieveMixin,
+                       FieldsMixin,
+                       DetailSerializerMixin,
                        viewsets.ModelViewSet):
-    queryset = (Estimator.objects
-                .prefetch_related('trainings'))
+    queryset = Estimator.objects
+    queryset_detail = (Estimator.objects
+                       .prefetch_related(Prefetch('trainings',
+                                                  queryset=(Training.objects
+                                                            .defer(*DETAIL_COLUMNS)
+                                                            .prefetch_related('chunks')))))
     serializer_class = EstimatorSerializer
     serializer_detail_class = EstimatorDetailSerializer
+    conditional_related = ('trainings',)
+    event_field = 'estimator_id'
+
+
+def decompressed(f, block_size=64 * 1024):
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+    with f:
+        for block in iter(lambda: f.read(block_size), b''):
+            yield decompressor.decompress(block)
+    yield decompressor.flush()
 
 
 class TaskCreateMixin(NestedViewSetMixin):
+    def create(self, request, *args, **kwargs):
+        # Tasks are queued and later executed by the workers.
+        response = super().create(request, *args, **kwargs)
+        response.status_code = status.HTTP_202_ACCEPTED
+        return response
+
     def perform_create(self, serializer: TaskSerializer):
         # Save parents' ids within the model.
         d = self.get_parents_query_dict()
         d = {k + '_id': v for k, v in d.items()}
 
-        serializer.save(**d, owner=self.request.user)
-        serializer.instance.start()
+        # Workers must not claim the task before its chunks are set.
+        with transaction.atomic():
+            serializer.save(**d, owner=self.request.user)
 
     def perform_destroy(self, instance):
-        instance.delete()
-        instance.rollback()
+        if instance.status == Task.Status.running.value:
+            raise ValidationError({'status': ['%s is running, and must be cancelled before '
+                                              'being deleted.' % instance]})
+        pk = instance.pk
+        with transaction.atomic():
+            instance.delete()
+            # Deleted instances have no pk, from which the paths of their files are built.
+            instance.pk = pk
+            instance.discard()
+
+    @detail_route(methods=['post'])
+    def cancel(self, request, *args, **kwargs):
+        instance = self.get_object()
+        if instance.cancel() is False:
+            raise ValidationError({'status': ['%s is %s, but only created or running tasks '
+                                              'can be cancelled.' % (instance, instance.status)]})
+        return Response(self.get_serializer(self.get_object()).data,
+                        status=status.HTTP_202_ACCEPTED)
+
+
+class TaskStatusMixin:
+    @detail_route(methods=['get'], url_path='status')
+    def wait_status(self, request, *args, **kwargs):
+        """Wait up to `timeout` seconds for the task to leave the given `status`."""
+        task = self.get_object()
+        options = settings.STATUS_EVENTS
+        known = request.query_params.get('status')
+        try:
+            timeout = min(float(request.query_params.get('timeout', 0)), options['max_wait'])
+        except ValueError:
+            raise ValidationError({'timeout': ['A number of seconds is expected.']})
+
+        deadline = time.monotonic() + timeout
+        current = {'status': task.status, 'updated_at': task.updated_at}
+
+        while current['status'] == known and time.monotonic() < deadline:
+            time.sleep(options['poll_interval'])
+            current = (type(task).objects
+                       .filter(pk=task.pk)
+                       .values('status', 'updated_at')
+                       .get())
+
+        return Response(dict(current, id=task.pk))
+
 
+def gzip_response(request, f):
+    if 'gzip' in request.META.get('HTTP_ACCEPT_ENCODING', ''):
+        response = FileResponse(f, content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+        return response
 
-class TrainingViewSet(TaskCreateMixin,
+    return StreamingHttpResponse(decompressed(f), content_type='application/json')
+
+
+class TaskOutputMixin:
+    @detail_route(methods=['get'])
+    def output(self, request, *args, **kwargs):
+        task = self.get_object()
+        if not task.output_file:
+            return Response(task.report)
+        return gzip_response(request, task.open_output())
+
+
+class TrainingViewSet(StatusEventsMixin,
+                      TaskCreateMixin,
+                      ConditionalRetrieveMixin,
+                      TaskStatusMixin,
+                      TaskOutputMixin,
+                      FieldsMixin,
+                      DetailSerializerMixin,
                       viewsets.ModelViewSet):
     queryset = (Training.objects
-                .prefetch_related('chunks'))
-    serializer_class = TrainingSerializer
+                .prefetch_related('chunks')
+                .defer(*DETAIL_COLUMNS))
+    queryset_detail = (Training.objects
+                       .prefetch_related('chunks'))
+    serializer_class = TrainingSummarySerializer
+    serializer_detail_class = TrainingSerializer
+    cached_statuses = FINISHED_STATUSES
+    event_field = 'training_id'
+
+    def get_completed_object(self):
+        training = self.get_object()
+        if training.status != Task.Status.completed.value:
+            raise ValidationError({'status': ['Training %s is %s, but only completed '
+                                              'trainings can be used for predictions.'
+                                              % (training.pk, training.status)]})
+        return training
+
+    @detail_route(methods=['get', 'post'])
+    def predict(self, request, *args, **kwargs):
+        import numpy as np
+
+        training = self.get_completed_object()
+        if request.method == 'GET':
+            return Response({'batches': models_cache.batch_stats(training)})
+
+        serializer = OnlinePredictionSerializer(data=request.data,
+                                                context={'training': training})
+        serializer.is_valid(raise_exception=True)
+
+        predictions = models_cache.predict(training,
+                                           np.asarray(serializer.validated_data['data']),
+                                           **serializer.validated_data['properties'])
+        return Response({'predictions': predictions})
+
+    @detail_route(methods=['post'])
+    def warm(self, request, *args, **kwargs):
+        models_cache.warm(self.get_completed_object())
+        return Response(models_cache.stats)
+
+    @detail_route(methods=['post'])
+    def resume(self, request, *args, **kwargs):
+        training = self.get_object()
+        if not training.resumable:
+            raise ValidationError({'status': ['Training %s is %s, but only interrupted or '
+                                              'failed trainings can be resumed.'
+                                              % (training.pk, training.status)]})
+        training.resume()
+        return Response(self.get_serializer(training).data,
+                        status=status.HTTP_202_ACCEPTED)
+
+    @detail_route(methods=['get', 'delete'])
+    def checkpoints(self, request, *args, **kwargs):
+        training = self.get_object()
+        if request.method == 'GET':
+            return Response([{'step': c.step,
+                              'saved_at': datetime.fromtimestamp(c.saved_at, timezone.utc)}
+                             for c in training.checkpoints.all()])
+
+        if training.status in (Task.Status.created.value, Task.Status.running.value):
+            raise ValidationError({'status': ['Training %s is %s, and its checkpoints may '
+                                              'still be used.' % (training.pk, training.status)]})
+        training.checkpoints.discard()
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
 
 class TestViewSet(TaskCreateMixin,
+                  ConditionalRetrieveMixin,
+                  TaskStatusMixin,
+                  TaskOutputMixin,
+                  FieldsMixin,
+                  DetailSerializerMixin,
                   viewsets.ModelViewSet):
-    queryset = Test.objects
-    serializer_class = TestSerializer
+    queryset = (Test.objects
+                .prefetch_related('chunks')
+                .defer(*DETAIL_COLUMNS))
+    queryset_detail = (Test.objects
+                       .prefetch_related('chunks'))
+    serializer_class = TestSummarySerializer
+    serializer_detail_class = TestSerializer
+    cached_statuses = FINISHED_STATUSES
 
 
 class PredictViewSet(TaskCreateMixin,
+                     ConditionalRetrieveMixin,
+                     TaskStatusMixin,
+                     TaskOutputMixin,
+                     FieldsMixin,
+                     DetailSerializerMixin,
                      viewsets.ModelViewSet):
-    queryset = Predict.objects
-    serializer_class = PredictSerializer
+    queryset = (Predict.objects
+                .prefetch_related('chunks')
+                .defer(*DETAIL_COLUMNS))
+    queryset_detail = (Predict.objects
+                       .prefetch_related('chunks'))
+    serializer_class = PredictSummarySerializer
+    serializer_detail_class = PredictSerializer
+    cached_statuses = FINISHED_STATUSES
+
+    @detail_route(methods=['get'])
+    def shards(self, request, *args, **kwargs):
+        task = self.get_object()
+        shards = task.shards
+        if shards is None:
+            raise ValidationError({'status': ['Prediction %s has no shards.' % task.pk]})
+
+        if 'index' not in request.query_params:
+            return Response(shards)
+        try:
+            shard = shards[int(request.query_params['index'])]
+        except (ValueError, IndexError):
+            raise ValidationError({'index': ['The index of one of the %i shards is expected.'
+                                             % len(shards)]})
+        return gzip_response(request, training_fs.open(shard['file'], 'rb'))
+
+
+class CrossValidationViewSet(TaskCreateMixin,
+                             ConditionalRetrieveMixin,
+                             TaskStatusMixin,
+                             TaskOutputMixin,
+                             FieldsMixin,
+                             DetailSerializerMixin,
+                             viewsets.ModelViewSet):
+    queryset = (CrossValidation.objects
+                .prefetch_related('chunks')
+                .defer(*DETAIL_COLUMNS))
+    queryset_detail = (CrossValidation.objects
+                       .prefetch_related('chunks'))
+    serializer_class = CrossValidationSummarySerializer
+    serializer_detail_class = CrossValidationSerializer
+    cached_statuses = FINISHED_STATUSES
+
+
+class SweepViewSet(TaskCreateMixin,
+                   ConditionalRetrieveMixin,
+                   FieldsMixin,
+                   DetailSerializerMixin,
+                   viewsets.ModelViewSet):
+    queryset = (Sweep.objects
+                .prefetch_related('chunks',
+                                  Prefetch('trainings',
+                                           queryset=Training.objects.only('status', 'sweep'))))
+    serializer_class = SweepSummarySerializer
+    serializer_detail_class = SweepSerializer
+    conditional_related = ('trainings',)
+
+    def perform_destroy(self, instance):
+        instance.cancel()
+        instance.delete()
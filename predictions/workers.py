@@ -0,0 +1,406 @@
+import multiprocessing
+import os
+import signal
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from collections import Counter, namedtuple
+from datetime import timedelta
+from logging import info, warning
+
+from django.apps import apps
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+from mlswarm_api.metrics import CONTENT_TYPE, registry
+from . import instrumentation, models
+from .slots import serve
+
+TASK_MODELS = (models.Training, models.Test, models.Predict, models.CrossValidation)
+
+Job = namedtuple('Job', ['model_name', 'pk', 'service', 'owner', 'cpus', 'memory', 'timeout'])
+
+
+class Slot:
+    """A child process of a `Worker`, running one task at a time."""
+
+    def __init__(self, context):
+        self.tasks = context.SimpleQueue()
+        self.done = context.SimpleQueue()
+        self.process = context.Process(target=serve, args=(self.tasks, self.done))
+        self.process.start()
+        self.job = None
+        self.served = 0
+        self.started_at = None
+        self.terminated_at = None
+        self.lost = False
+
+    def submit(self, job: Job):
+        self.job = job
+        self.started_at = time.monotonic()
+        self.terminated_at = None
+        self.tasks.put((job.model_name, job.pk))
+
+    def signal(self, signum, group=False):
+        try:
+            if group:
+                os.killpg(self.process.pid, signum)
+            else:
+                os.kill(self.process.pid, signum)
+        except ProcessLookupError:
+            pass
+
+    def terminate(self):
+        # Raises `TaskCancelled` within the task, which rolls itself back.
+        self.signal(signal.SIGTERM)
+        self.terminated_at = time.monotonic()
+
+    def kill(self):
+        self.signal(signal.SIGKILL, group=True)
+
+    def finished(self):
+        if self.job is None or self.done.empty():
+            return False
+
+        _, _, metrics = self.done.get()
+        registry.merge(metrics)
+        self.served += 1
+        return True
+
+    def stop(self):
+        if self.process.is_alive():
+            self.tasks.put(None)
+        self.process.join()
+
+
+class MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        body = registry.render().encode()
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPE)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+
+def machine_memory():
+    """The physical memory of this machine, in MiB."""
+    try:
+        return os.sysconf('SC_PAGE_SIZE') * os.sysconf('SC_PHYS_PAGES') // 1024 ** 2
+    except (ValueError, OSError, AttributeError):
+        return None
+
+
+class Worker:
+    """Claims created tasks from the database and runs them in child processes.
+
+    At most `processes` tasks run at once, and `concurrency` caps the
+    running tasks per estimator service. Tasks reserve the `cpus` and
+    `memory` they require, and are only started while the worker has enough
+    of both left.
+
+    Tasks of higher priority are started first. Among tasks of the same
+    priority, the owners with the fewest running tasks go first, so a
+    large sweep does not starve the tasks of other users.
+
+    Child processes are reused for
+    `max_tasks_per_child` tasks, after which they are replaced so the
+    memory held by ML libraries is given back.
+
+    Tasks are claimed through `Lease` rows, renewed on every iteration. Many
+    workers can therefore share the same database, and the tasks of a worker
+    that stops reporting are taken over by the others once its leases expire.
+    """
+
+    def __init__(self, processes: int = None, poll_interval: float = None,
+                 concurrency: dict = None, name: str = None,
+                 max_tasks_per_child: int = None, metrics_port: int = None,
+                 cpus: float = None, memory: int = None):
+        options = getattr(settings, 'TASK_WORKERS', {})
+
+        self.processes = processes or options.get('processes') or os.cpu_count()
+        self.poll_interval = poll_interval or options.get('poll_interval', 1.0)
+        self.concurrency = (concurrency if concurrency is not None
+                            else options.get('concurrency', {}))
+        self.name = (name or options.get('name')
+                     or '%s:%i' % (socket.gethostname(), os.getpid()))
+        self.lease_ttl = timedelta(seconds=options.get('lease_ttl', 60))
+        self.max_tasks_per_child = (max_tasks_per_child
+                                    or options.get('max_tasks_per_child'))
+        self.metrics_port = metrics_port or options.get('metrics_port')
+        self.cpus = cpus or options.get('cpus') or os.cpu_count()
+        self.memory = memory or options.get('memory') or machine_memory()
+        self.cancel_grace = options.get('cancel_grace', 30)
+        self.context = multiprocessing.get_context('spawn')
+        self.slots = []
+        self.events_retention = timedelta(
+            seconds=settings.STATUS_EVENTS.get('retention', 86400))
+        self.pruned_at = 0
+
+    def serve_metrics(self):
+        server = HTTPServer(('', self.metrics_port), MetricsHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        info('serving metrics on port %i', self.metrics_port)
+
+    def run(self, once: bool = False):
+        if self.metrics_port:
+            self.serve_metrics()
+
+        try:
+            while True:
+                self.heartbeat()
+                self.enforce()
+                self.reap()
+                self.dispatch()
+                self.prune()
+
+                if once and not self.jobs:
+                    break
+                time.sleep(self.poll_interval)
+        except KeyboardInterrupt:
+            info('worker interrupted, waiting for %i running task(s)', len(self.jobs))
+            # Child processes do not share the terminal's process group.
+            for slot in self.slots:
+                slot.signal(signal.SIGINT, group=True)
+        finally:
+            self.shutdown()
+
+    def prune(self):
+        # Old status events are dropped once a minute.
+        if time.monotonic() - self.pruned_at >= 60:
+            models.StatusEvent.prune(self.events_retention)
+            self.pruned_at = time.monotonic()
+
+    @property
+    def jobs(self):
+        return [s.job for s in self.slots if s.job is not None]
+
+    @property
+    def available(self):
+        return self.processes - len(self.jobs)
+
+    @property
+    def resources(self):
+        """The cpus and memory not reserved by the running tasks."""
+        jobs = self.jobs
+        return (self.cpus - sum(j.cpus for j in jobs),
+                None if self.memory is None else self.memory - sum(j.memory for j in jobs))
+
+    def fits(self, requirements: dict, total: bool = False):
+        cpus, memory = (self.cpus, self.memory) if total else self.resources
+        return (requirements.get('cpus', 0) <= cpus
+                and (memory is None or requirements.get('memory', 0) <= memory))
+
+    def candidates(self):
+        expired = list(models.Lease.objects
+                       .filter(expires_at__lt=timezone.now())
+                       .values_list('task_type', 'task_id'))
+        tasks = []
+
+        for model in TASK_MODELS:
+            model_name = model._meta.model_name
+            created = (model.objects
+                       .filter(status=models.Task.Status.created.value)
+                       .select_related('estimator'))
+            # The first tasks of every owner, so the fair share can be kept.
+            for owner in created.order_by().values_list('owner', flat=True).distinct():
+                tasks += (created
+                          .filter(owner_id=owner)
+                          .order_by('-priority', 'created_at')[:self.processes])
+            # Tasks whose workers died while running them.
+            tasks += (model.objects
+                      .filter(pk__in=[i for t, i in expired if t == model_name],
+                              status__in=(models.Task.Status.created.value,
+                                          models.Task.Status.running.value))
+                      .select_related('estimator'))
+
+        return tasks
+
+    def running_per_owner(self):
+        running = Counter()
+        for model in TASK_MODELS:
+            running.update(dict(model.objects
+                                .filter(status=models.Task.Status.running.value)
+                                .values_list('owner')
+                                .annotate(n=Count('pk'))
+                                .order_by()))
+        return running
+
+    def claim(self, task: models.Task) -> bool:
+        if not models.Lease.acquire(task, self.name, self.lease_ttl):
+            return False
+
+        if (type(task).objects
+                .filter(pk=task.pk, status__in=(models.Task.Status.created.value,
+                                                models.Task.Status.running.value))
+                .update(status=models.Task.Status.running.value,
+                        started_at=timezone.now(),
+                        updated_at=timezone.now())):
+            return True
+
+        models.Lease.release(task._meta.model_name, task.pk, self.name)
+        return False
+
+    def dispatch(self):
+        if self.available <= 0:
+            return
+
+        candidates = self.candidates()
+        if not candidates:
+            return
+
+        running = Counter(job.service for job in self.jobs)
+        owners = self.running_per_owner()
+
+        while candidates and self.available > 0:
+            candidates.sort(key=lambda t: (-t.priority, owners[t.owner_id], t.created_at))
+            task = candidates.pop(0)
+
+            service = task.estimator.service
+            limit = self.concurrency.get(service)
+            if limit is not None and running[service] >= limit:
+                continue
+
+            requirements = task.requirements
+            if not self.fits(requirements):
+                if not self.fits(requirements, total=True):
+                    warning('%s #%i requires more resources than the worker has: %s',
+                            task._meta.model_name, task.pk, requirements)
+                continue
+
+            if not self.claim(task):
+                continue
+
+            instrumentation.task_queue_wait.observe(
+                (timezone.now() - task.created_at).total_seconds(),
+                task=task._meta.model_name, priority=task.priority)
+            self.submit(Job(task._meta.model_name, task.pk, service, task.owner_id,
+                            requirements.get('cpus', 0), requirements.get('memory', 0),
+                            task.options.get('timeout')))
+            running[service] += 1
+            owners[task.owner_id] += 1
+
+    def submit(self, job: Job):
+        slot = next((s for s in self.slots if s.job is None), None)
+        if slot is None:
+            slot = Slot(self.context)
+            self.slots.append(slot)
+
+        slot.submit(job)
+        info('started %s #%i', job.model_name, job.pk)
+
+    def heartbeat(self):
+        """Renew the leases of the running tasks, killing those whose lease was lost.
+
+        A lease is lost when the worker stopped reporting for longer than
+        `lease_ttl` and another worker took the task over. The task is then
+        killed without being rolled back, as its files and status now belong
+        to the other worker.
+        """
+        held = models.Lease.heartbeat(self.name, self.lease_ttl)
+
+        for slot in self.slots:
+            job = slot.job
+            if job is not None and not slot.lost and (job.model_name, job.pk) not in held:
+                warning('%s #%i: lease taken over by another worker, killing it',
+                        job.model_name, job.pk)
+                slot.lost = True
+                slot.kill()
+
+    def enforce(self):
+        """Stop the tasks that were cancelled or ran out of time.
+
+        Tasks are first asked to stop, then killed along with their process
+        if they did not within `cancel_grace` seconds.
+        """
+        requested = set()
+        for model in TASK_MODELS:
+            model_name = model._meta.model_name
+            pks = [j.pk for j in self.jobs if j.model_name == model_name]
+            if pks:
+                requested.update((model_name, pk) for pk in (model.objects
+                                                             .filter(pk__in=pks,
+                                                                     cancel_requested=True)
+                                                             .values_list('pk', flat=True)))
+
+        now = time.monotonic()
+        for slot in self.slots:
+            job = slot.job
+            if job is None:
+                continue
+
+            if slot.terminated_at is None:
+                # Tasks time themselves out, the worker only steps in if they did not.
+                late = job.timeout and now - slot.started_at > job.timeout + self.cancel_grace
+                if (job.model_name, job.pk) in requested or late:
+                    info('stopping %s #%i', job.model_name, job.pk)
+                    slot.terminate()
+
+            elif now - slot.terminated_at > self.cancel_grace:
+                warning('%s #%i did not stop, killing its process', job.model_name, job.pk)
+                slot.kill()
+
+    def reap(self):
+        for slot in list(self.slots):
+            job = slot.job
+
+            if slot.finished():
+                slot.job = None
+                models.Lease.release(job.model_name, job.pk, self.name)
+
+                if self.max_tasks_per_child and slot.served >= self.max_tasks_per_child:
+                    slot.stop()
+                    self.slots.remove(slot)
+
+            elif not slot.process.is_alive():
+                slot.process.join()
+                self.slots.remove(slot)
+
+                if job is not None and not slot.lost:
+                    self.abandon(job, slot.process.exitcode,
+                                 stopped=slot.terminated_at is not None)
+                    models.Lease.release(job.model_name, job.pk, self.name)
+
+    def abandon(self, job: Job, exitcode: int, stopped: bool = False):
+        warning('%s #%i: worker process exited with code %s', job.model_name, job.pk, exitcode)
+
+        model = apps.get_model('predictions', job.model_name)
+        task = model.objects.filter(pk=job.pk, status=models.Task.Status.running.value).first()
+        if task is None:
+            return
+
+        if stopped:
+            # The task was killed before it could roll itself back.
+            try:
+                task.rollback()
+            except Exception as e:
+                warning('%s #%i could not be rolled back: %s', job.model_name, job.pk, e)
+            status = models.Task.Status.cancelled.value
+            errors = 'The task was stopped by killing its process.'
+        else:
+            status = models.Task.Status.failed.value
+            errors = 'The worker process exited with code %s.' % exitcode
+
+        if (model.objects
+                .filter(pk=job.pk, status=models.Task.Status.running.value)
+                .update(status=status,
+                        errors=errors,
+                        finished_at=timezone.now(),
+                        updated_at=timezone.now())):
+            models.StatusEvent.record(model.objects.get(pk=job.pk))
+
+    def shutdown(self):
+        while self.jobs:
+            self.heartbeat()
+            self.enforce()
+            self.reap()
+            time.sleep(self.poll_interval)
+
+        for slot in self.slots:
+            slot.stop()
+        self.slots = []